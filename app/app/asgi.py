@@ -0,0 +1,23 @@
+"""
+ASGI config for app project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('RECIPE_ASYNC_VIEWS', '1')
+
+django.setup(set_prefix=False)
+
+# Like get_asgi_application(), with streamed responses such as the export
+# read in a thread rather than in the event loop.
+from core.asgi import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
@@ -16,16 +16,34 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-# Quick-start development settings - unsuitable for production
+# Production settings come from the environment, the defaults are only
+# suitable for development.
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-gjg5g&i9^u4yt*n*#8kv2^ke7a3q$fck0wlpobo@*^0ehs@!5%'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-gjg5g&i9^u4yt*n*#8kv2^ke7a3q$fck0wlpobo@*^0ehs@!5%',
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# With DEBUG on, every SQL query of a request is also kept in memory.
+DEBUG = os.environ.get('DJANGO_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+# Comma separated. Left empty, only localhost is accepted and only while
+# DEBUG is on.
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host
+]
 
-ALLOWED_HOSTS = []
+# Addresses or networks (e.g. 10.0.0.0/8), comma separated, allowed to
+# read /metrics and /internal/. Others get a 404.
+INTERNAL_IPS = [
+    ip for ip in
+    os.environ.get('DJANGO_INTERNAL_IPS', '127.0.0.1,::1').split(',')
+    if ip
+]
 
 
 # Application definition
@@ -37,11 +55,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'recipe',
 ]
 
 MIDDLEWARE = [
+    # First, so it times the whole request. Exposed at /metrics.
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +74,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'app.urls'
 
+# Requests taking longer than SLOW_REQUEST_MS milliseconds are logged with
+# their SQL statements. 0 turns the log off.
+SLOW_REQUEST_THRESHOLD = int(os.environ.get('SLOW_REQUEST_MS', 0)) / 1000
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -71,18 +96,198 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Serve recipe list and detail through async views. Set by app/asgi.py,
+# a WSGI server would only pay for the extra event loop.
+RECIPE_ASYNC_VIEWS = os.environ.get('RECIPE_ASYNC_VIEWS') == '1'
+
+# Threads per process running the database work of the async views.
+RECIPE_ASYNC_THREADS = int(os.environ.get('RECIPE_ASYNC_THREADS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql plus health checks and pooling.
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Seconds a connection is kept for later requests, 0 closes it at
+        # the end of each request.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check reused connections with SELECT 1 before relying on them.
+        'CONN_HEALTH_CHECKS':
+            os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        # With DB_POOL_SIZE > 0, requests borrow connections from a pool of
+        # at most that many connections per process instead.
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 600)),
+        } if DB_POOL_SIZE else None,
+    }
+}
+
+# Read replica of the default database. Safe recipe reads are sent to it,
+# except for clients that just wrote (see DATABASE_REPLICA_LAG).
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'NAME': os.environ.get('DB_REPLICA_NAME',
+                               DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER',
+                               DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASS',
+                                   DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# Aliases recipe reads are spread over.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# Seconds a replica may trail the primary. A client that wrote reads from
+# the primary for that long, and responses read from a replica that soon
+# after a write are not cached.
+DATABASE_REPLICA_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'PAGE_SIZE': int(os.environ.get('RECIPE_PAGE_SIZE', 100)),
+    # Reverse proxies in front of the app. Clients are told apart by the
+    # address this many entries from the end of X-Forwarded-For, or by
+    # REMOTE_ADDR with 0, so that they cannot pick their own.
+    'NUM_PROXIES': int(os.environ.get('DJANGO_NUM_PROXIES', 0)),
+}
+
+# ?count=estimated counts exactly when the planner expects fewer results.
+RECIPE_EXACT_COUNT_BELOW = int(
+    os.environ.get('RECIPE_EXACT_COUNT_BELOW', 10000))
+
+# Maximum number of recipes accepted by a single batch request.
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 500))
+
+# Recipes read per server-side cursor fetch by the NDJSON export.
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+
+# Seconds a change must be old before the change feed returns it, so that
+# writes still being committed cannot land behind a consumer's cursor. On
+# Postgres, changes made after the start of the oldest write transaction
+# still open are held back as well, however long it runs.
+RECIPE_CHANGES_DELAY = float(os.environ.get('RECIPE_CHANGES_DELAY', 5))
+
+# Seconds between reads of the change feed by the autocomplete index of
+# each process, to pick up writes made by other processes.
+RECIPE_AUTOCOMPLETE_REFRESH = float(
+    os.environ.get('RECIPE_AUTOCOMPLETE_REFRESH', 1))
+
+# Number of similar recipes stored for each recipe.
+RECIPE_SIMILAR_COUNT = int(os.environ.get('RECIPE_SIMILAR_COUNT', 10))
+
+# Ingredients used by more recipes than this are too common to find
+# candidates when refreshing the similar recipes of edited ones. 0 turns
+# the cap off.
+RECIPE_SIMILAR_MAX_INGREDIENT_RECIPES = int(
+    os.environ.get('RECIPE_SIMILAR_MAX_INGREDIENT_RECIPES', 10000))
+
+
+# Per-client token buckets of the recipe API, off unless
+# RECIPE_THROTTLE_RATE is set. Clients get that many tokens per second,
+# up to RECIPE_THROTTLE_BURST, and each request spends the cost of its
+# action in RECIPE_THROTTLE_COSTS. Use 'recipe.throttling.SharedBuckets'
+# to share the buckets between processes through CACHES['default'].
+RECIPE_THROTTLE = None
+if os.environ.get('RECIPE_THROTTLE_RATE'):
+    RECIPE_THROTTLE = {
+        'BACKEND': os.environ.get('RECIPE_THROTTLE_BACKEND',
+                                  'recipe.throttling.LocalBuckets'),
+        'OPTIONS': {
+            'rate': float(os.environ['RECIPE_THROTTLE_RATE']),
+            'burst': float(os.environ.get('RECIPE_THROTTLE_BURST', 200)),
+        },
     }
+
+# Tokens spent per request by action, 1 for the others. 'search' is a
+# list filtered by name or ingredients.
+RECIPE_THROTTLE_COSTS = {
+    'retrieve': 1,
+    'autocomplete': 0.2,
+    'similar': 1,
+    'list': 5,
+    'search': 10,
+    'changes': 5,
+    'create': 5,
+    'update': 5,
+    'partial_update': 5,
+    'bulk': 20,
+    'bulk_destroy': 20,
+    'export': 100,
+}
+
+# Adaptive cap on the recipe API requests each process serves at once.
+# Requests beyond it get a 503 with Retry-After. Set
+# RECIPE_CONCURRENCY_MAX to 0 to turn it off.
+RECIPE_CONCURRENCY = {
+    'initial': int(os.environ.get('RECIPE_CONCURRENCY_INITIAL', 20)),
+    'minimum': int(os.environ.get('RECIPE_CONCURRENCY_MIN', 4)),
+    'maximum': int(os.environ.get('RECIPE_CONCURRENCY_MAX', 200)),
+}
+if not RECIPE_CONCURRENCY['maximum']:
+    RECIPE_CONCURRENCY = None
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Read-through cache of recipe list and detail responses. Use
+# 'recipe.cache.SharedCache' to keep it in CACHES['default'] instead of
+# in each process.
+RECIPE_CACHE = {
+    'BACKEND': os.environ.get('RECIPE_CACHE_BACKEND',
+                              'recipe.cache.LRUCache'),
+    'OPTIONS': {
+        'timeout': int(os.environ.get('RECIPE_CACHE_TIMEOUT', 60)),
+    },
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.0/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 
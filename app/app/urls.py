@@ -16,7 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import db_pool_stats, metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('recipe.urls'))
+    path('api/', include('recipe.urls')),
+    path('internal/db-pool/', db_pool_stats, name='db-pool-stats'),
+    path('metrics', metrics, name='metrics'),
 ]
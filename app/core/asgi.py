@@ -0,0 +1,54 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+_END = object()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI handler that reads streamed responses off the event loop.
+
+    Django 4.0 iterates over streamed responses in the event loop, where an
+    iterator that queries the database, like the NDJSON export, raises
+    SynchronousOnlyOperation. Each part is read with sync_to_async in the
+    thread of the request instead, the one the view ran in, so that a
+    server-side cursor stays on its connection.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Same headers as ASGIHandler.send_response.
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b'Set-Cookie',
+                 cookie.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        parts = iter(response)
+        read = sync_to_async(next, thread_sensitive=True)
+        try:
+            while True:
+                part = await read(parts, _END)
+                if part is _END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,117 @@
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _is_usable(connection) -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+def pool_stats() -> dict:
+    """Statistics of the connection pools of this process, by alias."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend with connection health checks and pooling.
+
+    ``CONN_HEALTH_CHECKS`` backports the Django 4.1 setting: a persistent
+    connection is checked with ``SELECT 1`` before its first use in a
+    request, and replaced if the server went away in between.
+
+    With ``POOL`` set, connections come from a per-process pool of at most
+    ``POOL['MAX_SIZE']`` connections instead. A request borrows one on its
+    first query and gives it back when it ends. ``POOL['TIMEOUT']`` bounds
+    the wait for a free connection and ``POOL['MAX_AGE']`` the lifetime of
+    pooled connections. Health checks then run when a connection is
+    borrowed.
+    """
+    health_check_done = False
+    _pool = None
+
+    @property
+    def health_check_enabled(self) -> bool:
+        return bool(self.settings_dict.get('CONN_HEALTH_CHECKS'))
+
+    def _get_pool(self, conn_params) -> ConnectionPool:
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            if key not in _pools:
+                config = self.settings_dict['POOL']
+                _pools[key] = ConnectionPool(
+                    max_size=config.get('MAX_SIZE', 10),
+                    timeout=config.get('TIMEOUT', 10),
+                    max_age=config.get('MAX_AGE'),
+                    check=_is_usable if self.health_check_enabled else None,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        if not self.settings_dict.get('POOL'):
+            return super().get_new_connection(conn_params)
+
+        self._pool = self._get_pool(conn_params)
+        try:
+            connection = self._pool.acquire(
+                partial(super().get_new_connection, conn_params))
+        except PoolTimeout as e:
+            raise base.Database.OperationalError(str(e)) from e
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def connect(self):
+        # A fresh connection does not need checking until it is reused.
+        self.health_check_done = True
+        super().connect()
+        if self._pool is not None:
+            # Return it to the pool when the request ends.
+            self.close_at = 0
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
+
+    def close_if_health_check_failed(self):
+        if (self.connection is None or not self.health_check_enabled
+                or self.health_check_done or self.in_atomic_block):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def _close(self):
+        if self._pool is None or self.connection is None:
+            return super()._close()
+
+        pool, connection, self._pool = self._pool, self.connection, None
+        # Inside an atomic block Django keeps a reference to the closed
+        # connection, so it cannot go back to the pool.
+        reusable = not connection.closed and not self.in_atomic_block
+        if reusable and (connection.get_transaction_status()
+                         != extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                reusable = False
+        if reusable and self.errors_occurred:
+            reusable = _is_usable(connection)
+        pool.release(connection, reusable)
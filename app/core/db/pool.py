@@ -0,0 +1,128 @@
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of raw DB-API connections for one process.
+
+    At most ``max_size`` connections exist at a time. When all of them are
+    in use, ``acquire`` waits up to ``timeout`` seconds for one to be
+    released. Idle connections are reused newest first, so surplus ones
+    age out, and connections older than ``max_age`` seconds are closed
+    instead of being reused.
+    """
+
+    def __init__(self, max_size: int, timeout: float = 10, max_age=None,
+                 check=None):
+        self._check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self._idle = []
+        self._created_at = {}
+        self._in_use = 0
+        self._lock = threading.Condition()
+        self._stats = dict.fromkeys(
+            ('connects', 'closes', 'checks_failed', 'waits', 'timeouts'), 0)
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def acquire(self, connect):
+        """Return an idle connection, or one made by calling ``connect``."""
+        with self._lock:
+            connection = self._reserve()
+        if connection is None:
+            return self._open(connect)
+        if self._check is not None and not self._check(connection):
+            with self._lock:
+                self._stats['checks_failed'] += 1
+            # Replace it in the slot it was holding.
+            self._close(connection)
+            return self._open(connect)
+        return connection
+
+    def release(self, connection, reusable: bool = True):
+        expired = (
+            self.max_age is not None
+            and time.monotonic() - self._created_at.get(id(connection), 0)
+            >= self.max_age
+        )
+        if not reusable or expired:
+            self._discard(connection)
+            return
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append(connection)
+            self._lock.notify()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'size': self._in_use + len(self._idle),
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats,
+                'wait_time_s': round(self._wait_time, 6),
+                'max_wait_time_s': round(self._max_wait_time, 6),
+            }
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close(connection)
+
+    def _reserve(self):
+        """Take an idle connection or a slot for a new one, waiting if needed.
+
+        Must be called with the lock held. Returns None for a new slot.
+        """
+        if not self._idle and self._in_use >= self.max_size:
+            self._stats['waits'] += 1
+            start = time.monotonic()
+            available = self._lock.wait_for(
+                lambda: self._idle or self._in_use < self.max_size,
+                self.timeout)
+            waited = time.monotonic() - start
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+            if not available:
+                self._stats['timeouts'] += 1
+                raise PoolTimeout(
+                    f'All {self.max_size} connections stayed in use for '
+                    f'{self.timeout}s.')
+        self._in_use += 1
+        return self._idle.pop() if self._idle else None
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except BaseException:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._stats['connects'] += 1
+            self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closes'] += 1
+            self._created_at.pop(id(connection), None)
+
+    def _discard(self, connection):
+        self._close(connection)
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
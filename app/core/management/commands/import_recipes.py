@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, RecipeImport
+from core.signals import recipes_changed
+
+NAME_MAX_LENGTH = 255
+
+
+def _jsonl_lines(stream):
+    return (line for line in stream if line.strip())
+
+
+def _parse_jsonl(line: str):
+    record = json.loads(line)
+    return (record['name'], record['description'],
+            [ingredient['name'] for ingredient in record['ingredients']])
+
+
+def _parse_csv(row: dict):
+    return (row['name'], row['description'],
+            [name for name in row['ingredients'].split('|') if name])
+
+
+READERS = {
+    'jsonl': (_jsonl_lines, _parse_jsonl),
+    'csv': (csv.DictReader, _parse_csv),
+}
+
+
+def _validate(record):
+    name, description, ingredients = record
+    if not name or len(name) > NAME_MAX_LENGTH:
+        raise ValueError('invalid name')
+    if not description:
+        raise ValueError('description may not be blank')
+    if not ingredients:
+        raise ValueError('a recipe needs at least one ingredient')
+    if any(not ingredient or len(ingredient) > NAME_MAX_LENGTH
+           for ingredient in ingredients):
+        raise ValueError('invalid ingredient name')
+    return record
+
+
+def _records(stream, file_format: str):
+    read, parse = READERS[file_format]
+    for number, raw in enumerate(read(stream), start=1):
+        try:
+            yield _validate(parse(raw))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise CommandError(f'Invalid recipe #{number}: {e!r}')
+
+
+def _copy(cursor, table: str, columns: tuple, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def copy_recipes(cursor, batch: list):
+    """Write (name, description, ingredient names) records with COPY.
+
+    Returns the ids of the new recipes and the number of ingredient links.
+    """
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence('core_recipe', 'id')) "
+        "FROM generate_series(1, %s)",
+        [len(batch)],
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+
+    now = timezone.now()
+    _copy(cursor, 'core_recipe',
+          ('id', 'name', 'description', 'ingredient_names',
+           'created_at', 'updated_at'), (
+              (recipe_id, name, description,
+               json.dumps(ingredients, ensure_ascii=False), now, now)
+              for recipe_id, (name, description, ingredients)
+              in zip(ids, batch)
+          ))
+    ingredient_ids = Ingredient.objects.ids_for(
+        ingredient for _, _, ingredients in batch
+        for ingredient in ingredients
+    )
+    ingredient_rows = [
+        (recipe_id, position, ingredient_ids[ingredient])
+        for recipe_id, (_, _, ingredients) in zip(ids, batch)
+        for position, ingredient in enumerate(ingredients)
+    ]
+    _copy(cursor, 'core_recipeingredient',
+          ('recipe_id', 'position', 'ingredient_id'), ingredient_rows)
+
+    return ids, len(ingredient_rows)
+
+
+class Command(BaseCommand):
+    help = ('Load recipes with nested ingredients from a JSONL or CSV file '
+            'using COPY. Progress is committed with every batch, so an '
+            'interrupted import resumes where it stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Input format, guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--source',
+            help='Name under which progress is tracked, defaults to the '
+                 'absolute path of the file.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore previous progress and import the whole file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_recipes needs PostgreSQL.')
+
+        path = options['path']
+        file_format = options['format'] or \
+            os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown input format {file_format!r}.')
+
+        progress, _ = RecipeImport.objects.get_or_create(
+            source=options['source'] or os.path.abspath(path))
+        if options['restart']:
+            progress.position = 0
+            progress.finished = False
+            progress.save()
+        if progress.finished:
+            self.stdout.write(f'{progress.source} was already imported.')
+            return
+        if progress.position:
+            self.stdout.write(
+                f'Resuming after {progress.position} recipes...')
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            records = _records(stream, file_format)
+            for _ in islice(records, progress.position):
+                pass
+            self._import(records, progress, options['batch_size'])
+
+        progress.finished = True
+        progress.save(update_fields=['finished'])
+
+    def _import(self, records, progress: RecipeImport, batch_size: int):
+        started = time.monotonic()
+        recipes = ingredients = 0
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                ids, ingredient_count = copy_recipes(cursor, batch)
+                progress.position += len(batch)
+                RecipeImport.objects.filter(pk=progress.pk) \
+                    .update(position=progress.position)
+            recipes_changed.send(sender=Recipe, recipe_ids=ids)
+            recipes += len(batch)
+            ingredients += ingredient_count
+
+            elapsed = max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f'{recipes} recipes, {ingredients} ingredients '
+                f'({(recipes + ingredients) / elapsed:.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {recipes} recipes and {ingredients} ingredients.'))
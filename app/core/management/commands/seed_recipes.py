@@ -0,0 +1,144 @@
+import math
+import random
+import time
+from itertools import accumulate, islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.management.commands.import_recipes import copy_recipes
+from core.models import Ingredient, Recipe, RecipeIngredient
+from core.signals import recipes_changed
+
+# Most used first: popularity falls with the rank in the catalogue.
+BASE_INGREDIENTS = (
+    'salt', 'olive oil', 'garlic', 'onion', 'butter', 'black pepper',
+    'sugar', 'flour', 'egg', 'water', 'milk', 'tomato', 'lemon', 'parsley',
+    'carrot', 'chicken', 'rice', 'cheese', 'cream', 'basil', 'potato',
+    'thyme', 'ginger', 'paprika', 'cumin', 'honey', 'vinegar', 'beef',
+    'mushroom', 'spinach', 'chili', 'coriander', 'celery', 'bell pepper',
+    'yogurt', 'pork', 'salmon', 'shrimp', 'lentils', 'chickpeas',
+)
+MODIFIERS = (
+    'fresh', 'dried', 'ground', 'smoked', 'roasted', 'chopped', 'grated',
+    'sliced', 'crushed', 'toasted', 'pickled', 'frozen', 'minced',
+    'whole', 'organic',
+)
+DISHES = (
+    'soup', 'stew', 'salad', 'curry', 'pie', 'risotto', 'pasta', 'tart',
+    'casserole', 'stir fry', 'omelette', 'pizza', 'paella', 'tacos',
+    'gratin', 'bowl', 'burger', 'sandwich', 'roast', 'skewers',
+)
+STYLES = (
+    'Classic', 'Rustic', 'Spicy', 'Creamy', 'Quick', 'Summer', 'Winter',
+    'Grandma\'s', 'Weeknight', 'Smoky', 'Crispy', 'Herby', 'Easy',
+    'Slow cooked', 'One pot',
+)
+METHODS = ('bake', 'simmer', 'fry', 'roast', 'grill', 'steam')
+
+# Ingredients per recipe follow a log-normal distribution: most recipes
+# need 5 to 12, a few need more than 20.
+MEDIAN_INGREDIENTS = 8
+INGREDIENTS_SIGMA = 0.45
+MAX_INGREDIENTS = 40
+
+
+def catalogue(size: int) -> list:
+    """Ingredient names, most popular first."""
+    variants = list(BASE_INGREDIENTS) + [
+        f'{modifier} {base}'
+        for modifier in MODIFIERS for base in BASE_INGREDIENTS]
+    names = list(variants)
+    number = 2
+    while len(names) < size:
+        names += [f'{name} {number}' for name in variants]
+        number += 1
+    return names[:size]
+
+
+def generate_recipes(rng: random.Random, ingredients: list):
+    """Endless stream of (name, description, ingredient names) records.
+
+    Ingredient popularity follows Zipf's law, so the head of the
+    catalogue appears in most recipes and its tail in few. The stream only
+    depends on the state of ``rng``.
+    """
+    cum_weights = list(accumulate(
+        1 / rank for rank in range(1, len(ingredients) + 1)))
+    mu = math.log(MEDIAN_INGREDIENTS)
+    while True:
+        count = min(max(round(rng.lognormvariate(mu, INGREDIENTS_SIGMA)), 1),
+                    MAX_INGREDIENTS, len(ingredients))
+        chosen = {}
+        while len(chosen) < count:
+            for index in rng.choices(range(len(ingredients)),
+                                     cum_weights=cum_weights, k=count):
+                chosen.setdefault(ingredients[index], None)
+        names = list(islice(chosen, count))
+
+        main = names[min(len(names) - 1, rng.randrange(3))]
+        name = f'{rng.choice(STYLES)} {rng.choice(DISHES)} with {main}'
+        description = (f'Mix the {names[0]} and the {names[-1]}, then '
+                       f'{rng.choice(METHODS)} for '
+                       f'{rng.randrange(5, 125, 5)} minutes.')
+        yield name, description, names
+
+
+def _create_batch(batch: list):
+    """ORM fallback for databases without COPY."""
+    recipes = Recipe.objects.bulk_create(
+        Recipe(name=name, description=description, ingredient_names=names)
+        for name, description, names in batch
+    )
+    ids = Ingredient.objects.ids_for(
+        name for _, _, names in batch for name in names)
+    links = RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, position=position,
+                         ingredient_id=ids[name])
+        for recipe in recipes
+        for position, name in enumerate(recipe.ingredient_names)
+    )
+    return [recipe.id for recipe in recipes], len(links)
+
+
+class Command(BaseCommand):
+    help = ('Insert synthetic recipes with a realistic number of '
+            'ingredients each. The same --seed always generates the same '
+            'recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--catalogue-size', type=int, default=1000,
+            help='Number of distinct ingredients to draw from.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        records = generate_recipes(rng, catalogue(options['catalogue_size']))
+
+        started = time.monotonic()
+        recipes = ingredients = 0
+        while recipes < options['count']:
+            size = min(options['batch_size'], options['count'] - recipes)
+            batch = list(islice(records, size))
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        ids, link_count = copy_recipes(cursor, batch)
+                else:
+                    ids, link_count = _create_batch(batch)
+            recipes_changed.send(sender=Recipe, recipe_ids=ids)
+            recipes += len(batch)
+            ingredients += link_count
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_recipe')
+                cursor.execute('ANALYZE core_recipeingredient')
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {recipes} recipes with {ingredients} ingredients '
+            f'({(recipes + ingredients) / elapsed:.0f} rows/s).'))
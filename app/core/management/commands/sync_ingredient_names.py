@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from core.signals import recipes_changed
+
+
+class Command(BaseCommand):
+    help = ('Compare the denormalized ingredient_names column of every '
+            'recipe with its ingredient links and rewrite the recipes that '
+            'drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drifted recipes and fail if there are any.')
+
+    def handle(self, *args, **options):
+        checked = 0
+        drifted = []
+        for recipe_ids in self._batches(options['batch_size']):
+            checked += len(recipe_ids)
+            if options['check']:
+                drift = Recipe.objects.ingredient_names_drift(recipe_ids)
+                drifted.extend(drift)
+                continue
+
+            with transaction.atomic():
+                synced = Recipe.objects.sync_ingredient_names(recipe_ids)
+            if synced:
+                recipes_changed.send(sender=Recipe, recipe_ids=synced)
+            drifted.extend(synced)
+
+        if options['check'] and drifted:
+            raise CommandError(
+                f'{len(drifted)} of {checked} recipes drifted: '
+                f'{", ".join(map(str, drifted[:20]))}'
+                f'{"..." if len(drifted) > 20 else ""}')
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Checked {checked} recipes, none drifted.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Checked {checked} recipes, rewrote {len(drifted)}.'))
+
+    @staticmethod
+    def _batches(batch_size: int):
+        last_id = 0
+        while True:
+            recipe_ids = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:batch_size])
+            if not recipe_ids:
+                return
+            yield recipe_ids
+            last_id = recipe_ids[-1]
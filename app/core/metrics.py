@@ -0,0 +1,159 @@
+"""Per-request performance metrics, exported in the Prometheus format.
+
+RequestMetricsMiddleware opens a RequestMetrics for every request. SQL run
+on any connection while it is open is added to it by an execute wrapper
+installed on each connection, and code that serializes responses adds its
+time with ``serialization()``. Both work across the threads the async
+views hand requests to, as the open RequestMetrics travels in a context
+variable.
+
+Gunicorn workers each count their own requests. With
+PROMETHEUS_MULTIPROC_DIR set, as done by gunicorn.conf.py, they write them
+to files there, and /metrics adds up the files of all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LABELS = ('view', 'method', 'status')
+
+REQUEST_DURATION = Histogram(
+    'recipe_request_duration_seconds',
+    'Wall time of requests, from the first middleware on.',
+    LABELS,
+)
+SQL_QUERIES = Histogram(
+    'recipe_request_sql_queries',
+    'SQL statements run per request.',
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf')),
+)
+SQL_DURATION = Histogram(
+    'recipe_request_sql_duration_seconds',
+    'Time per request spent waiting for SQL statements.',
+    LABELS,
+)
+SERIALIZATION_DURATION = Histogram(
+    'recipe_request_serialization_duration_seconds',
+    'Time per request spent serializing and rendering the response.',
+    LABELS,
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1,
+             float('inf')),
+)
+RESPONSE_SIZE = Histogram(
+    'recipe_response_size_bytes',
+    'Size of non-streaming response bodies.',
+    LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+             float('inf')),
+)
+
+# SQL statements kept per request for the slow request log.
+MAX_LOGGED_QUERIES = 100
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_time', 'serialization_time', 'statements')
+
+    def __init__(self, capture_sql: bool = False):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+        # (seconds, sql) of each statement, only kept when capturing.
+        self.statements = [] if capture_sql else None
+
+
+@contextmanager
+def collect(capture_sql: bool = False):
+    """Collect the metrics of the work done within the block."""
+    metrics = RequestMetrics(capture_sql)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def add_serialization_time(seconds: float):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.serialization_time += seconds
+
+
+@contextmanager
+def serialization():
+    """Count the block as serialization time of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_serialization_time(time.perf_counter() - start)
+
+
+def record_sql(execute, sql, params, many, context):
+    """Execute wrapper adding statements to the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.sql_time += duration
+        if (metrics.statements is not None
+                and len(metrics.statements) < MAX_LOGGED_QUERIES):
+            metrics.statements.append((duration, sql))
+
+
+def install_sql_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver wrapping every new connection."""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+_children = {}
+
+
+def _histograms(labels: tuple) -> tuple:
+    # Looking children up by labels takes a lock, keep them at hand.
+    children = _children.get(labels)
+    if children is None:
+        children = _children[labels] = tuple(
+            histogram.labels(*labels) for histogram in (
+                REQUEST_DURATION, SQL_QUERIES, SQL_DURATION,
+                SERIALIZATION_DURATION, RESPONSE_SIZE))
+    return children
+
+
+def observe(labels: tuple, duration: float, metrics: RequestMetrics,
+            size=None):
+    request_time, queries, sql_time, serialization_time, response_size = \
+        _histograms(labels)
+    request_time.observe(duration)
+    queries.observe(metrics.queries)
+    sql_time.observe(metrics.sql_time)
+    serialization_time.observe(metrics.serialization_time)
+    if size is not None:
+        response_size.observe(size)
+
+
+def exposition() -> tuple:
+    """Body and content type of the /metrics response."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,59 @@
+import logging
+import time
+
+from django.conf import settings
+
+from core import metrics
+
+logger = logging.getLogger('core.slow_requests')
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, SQL, serialization time and response size per view.
+
+    Place it first in MIDDLEWARE so the wall time covers the whole
+    request. With SLOW_REQUEST_THRESHOLD set, requests slower than that
+    many seconds are logged together with their SQL statements.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        start = time.perf_counter()
+        with metrics.collect(capture_sql=bool(threshold)) as collected:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        labels = (match.view_name if match else '<unresolved>',
+                  request.method, str(response.status_code))
+        size = None if response.streaming else len(response.content)
+        metrics.observe(labels, duration, collected, size)
+
+        if threshold and duration >= threshold:
+            self._log_slow(request, response, duration, collected)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered, DRF responses
+        # included: count the rendering as serialization.
+        start = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: metrics.add_serialization_time(
+                time.perf_counter() - start))
+        return response
+
+    @staticmethod
+    def _log_slow(request, response, duration, collected):
+        statements = '\n'.join(
+            f'  {seconds * 1000:.1f} ms  {sql}'
+            for seconds, sql in collected.statements)
+        logger.warning(
+            'Slow request: %s %s -> %s in %.1f ms, %d SQL statements in '
+            '%.1f ms, serialization %.1f ms\n%s',
+            request.method, request.get_full_path(), response.status_code,
+            duration * 1000, collected.queries, collected.sql_time * 1000,
+            collected.serialization_time * 1000, statements,
+        )
@@ -0,0 +1,58 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+TRIGRAM_INDEXES = [
+    GinIndex(
+        OpClass('name', name='gin_trgm_ops'),
+        name='core_recipe_name_trgm',
+    ),
+    GinIndex(
+        OpClass(Upper('name'), name='gin_trgm_ops'),
+        name='core_recipe_name_upper_trgm',
+    ),
+]
+
+
+def add_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('core', 'Recipe')
+    for index in TRIGRAM_INDEXES:
+        schema_editor.add_index(Recipe, index, concurrently=True)
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('core', 'Recipe')
+    for index in TRIGRAM_INDEXES:
+        schema_editor.remove_index(Recipe, index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and it
+    # keeps core_recipe writable while the indexes are built.
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_alter_ingredient_recipe'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='recipe', index=index)
+                for index in TRIGRAM_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_trigram_indexes,
+                    remove_trigram_indexes,
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+INGREDIENT_NAME_INDEX = models.Index(
+    Lower('name'), models.F('recipe'),
+    name='core_ingredient_lower_recipe',
+)
+
+
+def add_ingredient_name_index(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(Ingredient, INGREDIENT_NAME_INDEX,
+                                concurrently=True)
+    else:
+        schema_editor.add_index(Ingredient, INGREDIENT_NAME_INDEX)
+
+
+def remove_ingredient_name_index(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(Ingredient, INGREDIENT_NAME_INDEX,
+                                   concurrently=True)
+    else:
+        schema_editor.remove_index(Ingredient, INGREDIENT_NAME_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # Build the index without locking core_ingredient against writes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_recipeimport'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='ingredient',
+                                    index=INGREDIENT_NAME_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_ingredient_name_index,
+                    remove_ingredient_name_index,
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+# Renaming a table keeps the names of its sequence and primary key, which
+# the new core_ingredient table needs for itself.
+RENAMED_RELATIONS = [
+    ('SEQUENCE', 'core_ingredient_id_seq', 'core_recipeingredient_id_seq'),
+    ('INDEX', 'core_ingredient_pkey', 'core_recipeingredient_pkey'),
+]
+
+
+def rename_relations(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for kind, old, new in RENAMED_RELATIONS:
+        schema_editor.execute(f'ALTER {kind} IF EXISTS {old} RENAME TO {new}')
+
+
+def restore_relation_names(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for kind, old, new in RENAMED_RELATIONS:
+        schema_editor.execute(f'ALTER {kind} IF EXISTS {new} RENAME TO {old}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ingredient_name_index'),
+    ]
+
+    operations = [
+        # The pg_trgm indexes created by 0003 stay in the database, they are
+        # only dropped from the model state: other backends rebuilding
+        # core_recipe would otherwise try to recreate these Postgres-only
+        # indexes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='recipe',
+                    name='core_recipe_name_trgm',
+                ),
+                migrations.RemoveIndex(
+                    model_name='recipe',
+                    name='core_recipe_name_upper_trgm',
+                ),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingredient_lower_recipe',
+        ),
+        migrations.RenameModel(
+            old_name='Ingredient',
+            new_name='RecipeIngredient',
+        ),
+        migrations.RunPython(rename_relations, restore_relation_names),
+        # Nullable so that migrating backwards can re-add the column
+        # before restoring its values.
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='core.recipe'),
+        ),
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'indexes': [models.Index(django.db.models.functions.text.Lower('name'), name='core_ingredient_lower')],
+            },
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='ingredient',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recipe_ingredients', to='core.ingredient'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_catalogue(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+
+    names = RecipeIngredient.objects.values_list('name', flat=True).distinct()
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name) for name in names.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    RecipeIngredient.objects.update(ingredient=Subquery(
+        Ingredient.objects.filter(name=OuterRef('name')).values('id')[:1]
+    ))
+
+
+def restore_names(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+
+    RecipeIngredient.objects.update(name=Subquery(
+        Ingredient.objects.filter(id=OuterRef('ingredient_id'))
+        .values('name')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_ingredient_catalogue'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_catalogue, restore_names),
+    ]
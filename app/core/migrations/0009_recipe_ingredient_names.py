@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+FILL_SQL = """
+UPDATE core_recipe SET ingredient_names = COALESCE((
+    SELECT jsonb_agg(i.name ORDER BY l.id)
+    FROM core_recipeingredient l
+    JOIN core_ingredient i ON i.id = l.ingredient_id
+    WHERE l.recipe_id = core_recipe.id
+), '[]'::jsonb)
+"""
+
+
+def fill_ingredient_names(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(FILL_SQL)
+        return
+
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    recipes = {
+        pk: Recipe(id=pk, ingredient_names=[])
+        for pk in Recipe.objects.values_list('id', flat=True)
+    }
+    links = RecipeIngredient.objects.order_by('id') \
+        .values_list('recipe_id', 'ingredient__name')
+    for recipe_id, name in links.iterator():
+        recipes[recipe_id].ingredient_names.append(name)
+    Recipe.objects.bulk_update(
+        recipes.values(), ['ingredient_names'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_ingredients_through_catalogue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_names',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(fill_ingredient_names,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+RECIPE_INDEXES = [
+    models.Index(fields=['created_at'], name='core_recipe_created_at'),
+    models.Index(fields=['updated_at', 'id'], name='core_recipe_updated_id'),
+]
+
+
+def add_recipe_indexes(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    concurrently = schema_editor.connection.vendor == 'postgresql'
+    for index in RECIPE_INDEXES:
+        if concurrently:
+            schema_editor.add_index(Recipe, index, concurrently=True)
+        else:
+            schema_editor.add_index(Recipe, index)
+
+
+def remove_recipe_indexes(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    concurrently = schema_editor.connection.vendor == 'postgresql'
+    for index in RECIPE_INDEXES:
+        if concurrently:
+            schema_editor.remove_index(Recipe, index, concurrently=True)
+        else:
+            schema_editor.remove_index(Recipe, index)
+
+
+class Migration(migrations.Migration):
+
+    # Build the indexes without locking core_recipe against writes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_recipe_change_tracking'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='recipe', index=index)
+                for index in RECIPE_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_recipe_indexes,
+                    remove_recipe_indexes,
+                ),
+            ],
+        ),
+    ]
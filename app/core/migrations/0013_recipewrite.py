@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipesimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeWrite',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('action', models.CharField(
+                    choices=[('create', 'Create'), ('update', 'Update')],
+                    max_length=10)),
+                ('recipe_id', models.BigIntegerField(null=True)),
+                ('payload', models.JSONField()),
+                ('partial', models.BooleanField(default=False)),
+                ('status', models.CharField(
+                    choices=[('pending', 'Pending'), ('done', 'Done'),
+                             ('failed', 'Failed')],
+                    default='pending', max_length=10)),
+                ('errors', models.JSONField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(condition=models.Q(('status', 'pending')),
+                                 fields=['id'],
+                                 name='core_recipewrite_pending'),
+                ],
+            },
+        ),
+    ]
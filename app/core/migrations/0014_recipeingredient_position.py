@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+FILL_SQL = """
+UPDATE core_recipeingredient l SET position = n.position
+FROM (
+    SELECT id, row_number() OVER (
+        PARTITION BY recipe_id ORDER BY id) - 1 AS position
+    FROM core_recipeingredient
+) n
+WHERE n.id = l.id AND n.position > 0
+"""
+
+
+def fill_positions(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(FILL_SQL)
+        return
+
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    positions = {}
+    moved = []
+    links = RecipeIngredient.objects.order_by('id') \
+        .values_list('id', 'recipe_id')
+    for link_id, recipe_id in links.iterator():
+        position = positions.get(recipe_id, 0)
+        positions[recipe_id] = position + 1
+        if position:
+            moved.append(RecipeIngredient(id=link_id, position=position))
+    RecipeIngredient.objects.bulk_update(
+        moved, ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipewrite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+    ]
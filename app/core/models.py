@@ -1,21 +1,265 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+
+class IngredientManager(models.Manager):
+    def ids_for(self, names) -> dict:
+        """Map names to catalogue ids, inserting the missing ones in bulk.
+
+        Names are inserted in sorted order, so concurrent writers take the
+        unique index locks in the same order instead of deadlocking.
+        """
+        names = sorted(set(names))
+        self.bulk_create(
+            (self.model(name=name) for name in names),
+            ignore_conflicts=True,
+        )
+        return dict(
+            self.filter(name__in=names).values_list('name', 'id'))
+
+
+class Ingredient(models.Model):
+    """Catalogue entry shared by every recipe using the ingredient."""
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = IngredientManager()
+
+    class Meta:
+        indexes = [
+            models.Index(Lower('name'), name='core_ingredient_lower'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeManager(models.Manager):
+    def linked_ingredient_names(self, recipe_ids) -> dict:
+        """Map recipe ids to their ingredient names read from the links."""
+        names = defaultdict(list)
+        rows = (
+            RecipeIngredient.objects
+            .filter(recipe_id__in=recipe_ids)
+            .order_by('position', 'id')
+            .values_list('recipe_id', 'ingredient__name')
+        )
+        for recipe_id, name in rows:
+            names[recipe_id].append(name)
+        return names
+
+    def ingredient_names_drift(self, recipe_ids) -> dict:
+        """Map recipes whose `ingredient_names` differs from their links
+        to the names read from the links."""
+        recipe_ids = list(recipe_ids)
+        linked = self.linked_ingredient_names(recipe_ids)
+        stored = self.filter(id__in=recipe_ids) \
+            .values_list('id', 'ingredient_names')
+        return {
+            recipe_id: linked[recipe_id]
+            for recipe_id, names in stored
+            if names != linked[recipe_id]
+        }
+
+    def sync_ingredient_names(self, recipe_ids) -> list:
+        """Rewrite `ingredient_names` from the links where it drifted.
+
+        Returns the ids of the rewritten recipes.
+        """
+        drift = self.ingredient_names_drift(recipe_ids)
+        now = timezone.now()
+        self.bulk_update(
+            [self.model(id=recipe_id, ingredient_names=names, updated_at=now)
+             for recipe_id, names in drift.items()],
+            ['ingredient_names', 'updated_at'],
+        )
+        return list(drift)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the recipes, leaving a tombstone for each of them."""
+        with transaction.atomic(using=self.db):
+            recipe_ids = list(self.values_list('id', flat=True))
+            RecipeTombstone.objects.bulk_create(
+                (RecipeTombstone(recipe_id=recipe_id)
+                 for recipe_id in recipe_ids),
+                ignore_conflicts=True,
+            )
+            return self.model._base_manager \
+                .filter(id__in=recipe_ids).delete()
 
 
 class Recipe(models.Model):
+    # Has pg_trgm GIN indexes on name and UPPER(name), created by migration
+    # 0003 and left out of the model state by 0006, so `name__contains` and
+    # `name__icontains` (LIKE '%x%') do not scan the whole table.
     name = models.CharField(max_length=255)
     description = models.TextField()
+    ingredients = models.ManyToManyField(
+        Ingredient,
+        through='RecipeIngredient',
+        related_name='recipes',
+    )
+    # Read model: copy of the ingredient names in link order, written
+    # together with the links so reads do not need to join them. The
+    # `sync_ingredient_names` command detects and repairs drift.
+    ingredient_names = models.JSONField(default=list, editable=False)
+    # Bumped by every write to the recipe or its ingredients, feeds the
+    # /api/recipes/changes/ endpoint together with RecipeTombstone.
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeManager.from_queryset(RecipeQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'],
+                         name='core_recipe_created_at'),
+            models.Index(fields=['updated_at', 'id'],
+                         name='core_recipe_updated_id'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            RecipeTombstone.objects.bulk_create(
+                [RecipeTombstone(recipe_id=self.pk)], ignore_conflicts=True)
+            return super().delete(*args, **kwargs)
 
-class Ingredient(models.Model):
-    name = models.CharField(max_length=255)
+
+class RecipeTombstone(models.Model):
+    """Marks a deleted recipe for consumers of the change feed."""
+    recipe_id = models.BigIntegerField(primary_key=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'recipe_id'],
+                         name='core_recipetomb_deleted_id'),
+        ]
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id}'
+
+
+class RecipeIngredient(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.PROTECT,
+        related_name='recipe_ingredients',
+        db_index=False,
+    )
+    # Place of the ingredient in the recipe's list, from 0. Updates only
+    # rewrite the links whose place changed.
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Inverted index from catalogue ingredient to recipes.
+            models.Index(fields=['ingredient', 'recipe'],
+                         name='core_recipeingr_ingr_recipe'),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} in {self.recipe}'
+
+
+class RecipeSimilarity(models.Model):
+    """A recipe among the most similar of another by ingredient overlap.
+
+    Precomputed by the `compute_similar_recipes` command and refreshed
+    by `refresh_similar_recipes` for the recipes written through
+    RecipeSerializer.
+    """
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name='ingredients'
+        related_name='similarities',
+        db_index=False,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
     )
+    # Jaccard similarity of the two sets of catalogue ingredients.
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'similar'],
+                                    name='core_recipesimilarity_pair'),
+        ]
 
     def __str__(self):
-        return self.name
+        return f'{self.similar} like {self.recipe}'
+
+
+class RecipeSimilarityRefresh(models.Model):
+    """A recipe whose ingredients were written, queued in the same
+    transaction until `refresh_similar_recipes` refreshes its similar
+    recipes.
+
+    A recipe written again while being refreshed gets a new row, so the
+    worker only deletes the rows it read.
+    """
+    recipe_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id}'
+
+
+class RecipeWrite(models.Model):
+    """A recipe create or update queued by a request sent with
+    ``Prefer: respond-async``, applied by `process_recipe_writes`."""
+    CREATE = 'create'
+    UPDATE = 'update'
+    ACTIONS = [(CREATE, 'Create'), (UPDATE, 'Update')]
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    # Recipe updated, or created once the write is done.
+    recipe_id = models.BigIntegerField(null=True)
+    payload = models.JSONField()
+    partial = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    errors = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending writes, the others are only
+            # read by id.
+            models.Index(fields=['id'], name='core_recipewrite_pending',
+                         condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.pk} ({self.status})'
+
+
+class RecipeImport(models.Model):
+    """Progress of an `import_recipes` run, used to resume after failures."""
+    source = models.CharField(max_length=255, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.source
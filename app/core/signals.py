@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by writers that bypass model signals (bulk inserts, COPY imports)
+# with the ids of the recipes they created or modified as `recipe_ids`.
+recipes_changed = Signal()
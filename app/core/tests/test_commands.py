@@ -1,8 +1,17 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import Ingredient, Recipe, RecipeImport, RecipeIngredient
+
 
 class CommandTest(TestCase):
     def test_wait_for_db_ready(self):
@@ -17,3 +26,171 @@ class CommandTest(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+class ImportRecipesCommandTest(TestCase):
+    def _write(self, suffix: str, content: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _jsonl(self, count: int, start: int = 0) -> str:
+        return ''.join(json.dumps({
+            'name': f'Pizza {i}',
+            'description': 'Put it in the oven',
+            'ingredients': [{'name': 'dough'}, {'name': f'topping {i}'}],
+        }) + '\n' for i in range(start, start + count))
+
+    def _import(self, path: str, *args) -> str:
+        out = StringIO()
+        call_command('import_recipes', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_jsonl(self):
+        path = self._write('.jsonl', self._jsonl(5))
+
+        out = self._import(path, '--batch-size', '2')
+
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertEqual(RecipeIngredient.objects.count(), 10)
+        self.assertEqual(Ingredient.objects.count(), 6)
+        for recipe in Recipe.objects.all():
+            number = recipe.name.split()[-1]
+            self.assertEqual(
+                sorted(recipe.ingredients.values_list('name', flat=True)),
+                ['dough', f'topping {number}'])
+            self.assertEqual(recipe.ingredient_names,
+                             ['dough', f'topping {number}'])
+        self.assertIn('rows/s', out)
+        self.assertTrue(RecipeImport.objects.get().finished)
+
+    def test_import_csv(self):
+        path = self._write('.csv', 'name,description,ingredients\n'
+                                   'Pizza,"Bake it, hot",dough|cheese\n')
+
+        self._import(path)
+
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.description, 'Bake it, hot')
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list('name', flat=True)),
+            ['cheese', 'dough'])
+
+    def test_import_resumes_after_failure(self):
+        content = self._jsonl(3) + '{"name": ""}\n' + self._jsonl(2, 3)
+        path = self._write('.jsonl', content)
+
+        with self.assertRaises(CommandError):
+            self._import(path, '--batch-size', '2')
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(RecipeImport.objects.get().position, 2)
+
+        with open(path, 'w') as f:
+            f.write(self._jsonl(5))
+        self._import(path, '--batch-size', '2')
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', flat=True)),
+            [f'Pizza {i}' for i in range(5)])
+
+    def test_finished_import_is_not_repeated(self):
+        path = self._write('.jsonl', self._jsonl(2))
+        self._import(path)
+
+        out = self._import(path)
+
+        self.assertIn('already imported', out)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        self._import(path, '--restart')
+        self.assertEqual(Recipe.objects.count(), 4)
+
+
+class SyncIngredientNamesCommandTest(TestCase):
+    def setUp(self):
+        self.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                name=f'Pizza {i}', description='Bake it',
+                ingredient_names=['dough', 'cheese'])
+            ids = Ingredient.objects.ids_for(['dough', 'cheese'])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient_id=ids['dough'])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient_id=ids['cheese'])
+            self.recipes.append(recipe)
+
+    def _sync(self, *args) -> str:
+        out = StringIO()
+        call_command('sync_ingredient_names', '--batch-size', '2', *args,
+                     stdout=out)
+        return out.getvalue()
+
+    def test_in_sync(self):
+        out = self._sync('--check')
+
+        self.assertIn('Checked 3 recipes, none drifted', out)
+
+    def test_check_reports_drift(self):
+        drifted = self.recipes[2]
+        Recipe.objects.filter(pk=drifted.pk).update(ingredient_names=[])
+
+        with self.assertRaisesMessage(CommandError, f'1 of 3 recipes '
+                                      f'drifted: {drifted.pk}'):
+            self._sync('--check')
+
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.ingredient_names, [])
+
+    def test_repairs_drift(self):
+        drifted = self.recipes[0]
+        Recipe.objects.filter(pk=drifted.pk) \
+            .update(ingredient_names=['cheese', 'dough', 'ham'])
+
+        out = self._sync()
+
+        self.assertIn('Checked 3 recipes, rewrote 1', out)
+        updated_at = drifted.updated_at
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.ingredient_names, ['dough', 'cheese'])
+        self.assertGreater(drifted.updated_at, updated_at)
+        self.assertIn('none drifted', self._sync('--check'))
+
+
+class SeedRecipesCommandTest(TestCase):
+    def _seed(self, *args) -> str:
+        out = StringIO()
+        call_command('seed_recipes', *args, stdout=out)
+        return out.getvalue()
+
+    def _recipes(self) -> list:
+        return list(Recipe.objects.order_by('id')
+                    .values_list('name', 'description', 'ingredient_names'))
+
+    def test_seeds_recipes_with_links(self):
+        out = self._seed('25', '--batch-size', '10')
+
+        self.assertIn('Seeded 25 recipes', out)
+        self.assertEqual(Recipe.objects.count(), 25)
+        counts = [len(names) for _, _, names in self._recipes()]
+        self.assertTrue(all(1 <= count <= 40 for count in counts))
+        self.assertEqual(RecipeIngredient.objects.count(), sum(counts))
+        self.assertEqual(
+            Recipe.objects.ingredient_names_drift(
+                Recipe.objects.values_list('id', flat=True)), {})
+
+    def test_same_seed_same_recipes(self):
+        self._seed('10', '--seed', '7', '--batch-size', '3')
+        first = self._recipes()
+        Recipe.objects.all().delete()
+
+        self._seed('10', '--seed', '7')
+
+        self.assertEqual(self._recipes(), first)
+        Recipe.objects.all().delete()
+        self._seed('10', '--seed', '8')
+        self.assertNotEqual(self._recipes(), first)
@@ -0,0 +1,88 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from core import metrics
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+LIST_LABELS = {'view': 'recipe:recipe-list', 'method': 'GET',
+               'status': '200'}
+
+
+def sample(name: str, labels: dict = LIST_LABELS) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        Recipe.objects.create(name='Pizza', description='Sour dough',
+                              ingredient_names=['tomato'])
+
+    def test_records_request(self):
+        before = {name: sample(name) for name in (
+            'recipe_request_duration_seconds_count',
+            'recipe_request_sql_queries_sum',
+            'recipe_request_serialization_duration_seconds_sum',
+            'recipe_response_size_bytes_sum',
+        )}
+
+        res = self.client.get(RECIPE_URL, {'_': 'uncached'})
+
+        self.assertEqual(
+            sample('recipe_request_duration_seconds_count')
+            - before['recipe_request_duration_seconds_count'], 1)
+        self.assertEqual(
+            sample('recipe_request_sql_queries_sum')
+            - before['recipe_request_sql_queries_sum'], 1)
+        self.assertGreater(
+            sample('recipe_request_serialization_duration_seconds_sum'),
+            before['recipe_request_serialization_duration_seconds_sum'])
+        self.assertEqual(
+            sample('recipe_response_size_bytes_sum')
+            - before['recipe_response_size_bytes_sum'], len(res.content))
+
+    def test_metrics_endpoint(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'recipe_request_duration_seconds_bucket{', res.content)
+
+    def test_metrics_endpoint_is_internal(self):
+        res = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7')
+
+        self.assertEqual(res.status_code, 404)
+
+        with override_settings(INTERNAL_IPS=['203.0.113.0/24']):
+            res = self.client.get(reverse('metrics'),
+                                  REMOTE_ADDR='203.0.113.7')
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=1e-9)
+    def test_slow_request_log(self):
+        with self.assertLogs('core.slow_requests', 'WARNING') as logs:
+            self.client.get(RECIPE_URL, {'_': 'slow'})
+
+        self.assertIn(f'GET {RECIPE_URL}?_=slow -> 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_no_slow_request_log_by_default(self):
+        with self.assertNoLogs('core.slow_requests', 'WARNING'):
+            self.client.get(RECIPE_URL)
+
+    def test_nothing_collected_outside_requests(self):
+        with metrics.serialization():
+            Recipe.objects.count()
+
+        with metrics.collect() as collected:
+            Recipe.objects.count()
+            with metrics.serialization():
+                pass
+
+        self.assertEqual(collected.queries, 1)
+        self.assertGreater(collected.serialization_time, 0)
@@ -1,4 +1,5 @@
 from unittest import TestCase
+from unittest.mock import patch
 
 from core import models
 
@@ -14,12 +15,32 @@ class ModelTest(TestCase):
         self.assertEqual(str(recipe), recipe.name)
 
     def test_ingredient(self):
-        ingredient = models.Ingredient(
-            name='Tomato',
+        ingredient = models.Ingredient(name='Tomato')
+
+        self.assertEqual(str(ingredient), ingredient.name)
+
+    def test_recipe_ingredient(self):
+        recipe_ingredient = models.RecipeIngredient(
+            ingredient=models.Ingredient(name='Tomato'),
             recipe=models.Recipe(
                 name='Pizza',
                 description='Best pizza'
             )
         )
 
-        self.assertEqual(str(ingredient), ingredient.name)
+        self.assertEqual(str(recipe_ingredient), 'Tomato in Pizza')
+
+    def test_recipe_tombstone(self):
+        tombstone = models.RecipeTombstone(recipe_id=7)
+
+        self.assertEqual(str(tombstone), 'Recipe 7')
+
+    def test_ids_for_inserts_in_sorted_order(self):
+        manager = models.Ingredient.objects
+        with patch.object(type(manager), 'bulk_create') as bulk_create, \
+                patch.object(type(manager), 'filter'):
+            manager.ids_for(['salt', 'dough', 'cheese', 'dough'])
+
+        inserted = [ingredient.name
+                    for ingredient in bulk_create.call_args[0][0]]
+        self.assertEqual(inserted, ['cheese', 'dough', 'salt'])
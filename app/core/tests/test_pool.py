@@ -0,0 +1,214 @@
+import threading
+from copy import deepcopy
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    def test_reuses_released_connection(self):
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+
+        self.assertIs(pool.acquire(FakeConnection), first)
+        self.assertEqual(pool.stats()['connects'], 1)
+
+    def test_opens_up_to_max_size(self):
+        pool = ConnectionPool(max_size=2, timeout=0.01)
+        first = pool.acquire(FakeConnection)
+        second = pool.acquire(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        self.assertIsNot(first, second)
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['wait_time_s'], 0)
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        held = pool.acquire(FakeConnection)
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(pool.acquire(FakeConnection)))
+        waiter.start()
+
+        pool.release(held)
+        waiter.join()
+
+        self.assertEqual(acquired, [held])
+        self.assertEqual(pool.stats()['waits'], 1)
+        self.assertEqual(pool.stats()['timeouts'], 0)
+
+    def test_failed_check_replaces_connection(self):
+        pool = ConnectionPool(max_size=1,
+                              check=lambda conn: not conn.closed)
+        broken = pool.acquire(FakeConnection)
+        pool.release(broken)
+        broken.closed = True
+
+        replacement = pool.acquire(FakeConnection)
+
+        self.assertIsNot(replacement, broken)
+        stats = pool.stats()
+        self.assertEqual(stats['checks_failed'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    @patch('core.db.pool.time.monotonic')
+    def test_old_connections_are_closed(self, monotonic):
+        pool = ConnectionPool(max_size=1, max_age=60)
+        monotonic.return_value = 100
+        old = pool.acquire(FakeConnection)
+
+        monotonic.return_value = 160
+        pool.release(old)
+
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertIsNot(pool.acquire(FakeConnection), old)
+
+    def test_unusable_connection_frees_its_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        broken = pool.acquire(FakeConnection)
+
+        pool.release(broken, reusable=False)
+
+        self.assertTrue(broken.closed)
+        self.assertIsNot(pool.acquire(FakeConnection), broken)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+
+        def fail():
+            raise OSError('server is down')
+
+        with self.assertRaises(OSError):
+            pool.acquire(fail)
+
+        self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+    def test_close_idle(self):
+        pool = ConnectionPool(max_size=2)
+        idle = pool.acquire(FakeConnection)
+        pool.release(idle)
+
+        pool.close_idle()
+
+        self.assertTrue(idle.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+class PoolStatsViewTests(SimpleTestCase):
+    @patch('core.views.pool_stats')
+    def test_reports_pools_of_process(self, pool_stats):
+        pool_stats.return_value = {'default': {'in_use': 1}}
+
+        res = self.client.get(reverse('db-pool-stats'))
+
+        self.assertEqual(res.json()['pools'], {'default': {'in_use': 1}})
+        self.assertIn('pid', res.json())
+
+    def test_hidden_from_external_clients(self):
+        res = self.client.get(reverse('db-pool-stats'),
+                              REMOTE_ADDR='203.0.113.7')
+
+        self.assertEqual(res.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Backend for PostgreSQL')
+class PostgresBackendTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self._aliases = set()
+
+    def _wrapper(self, alias: str, **settings):
+        settings_dict = deepcopy(connection.settings_dict)
+        settings_dict.update(settings)
+        wrapper = type(connections['default'])(settings_dict, alias)
+        if wrapper.settings_dict.get('POOL'):
+            # Pooled connections outlive the wrapper, which would keep the
+            # test database from being dropped.
+            self.addCleanup(
+                lambda: wrapper._get_pool(
+                    wrapper.get_connection_params()).close_idle())
+        self.addCleanup(wrapper.close)
+        # django.contrib.postgres looks the alias up when connecting.
+        if alias not in self._aliases:
+            self._aliases.add(alias)
+            connections[alias] = wrapper
+            self.addCleanup(connections.__delitem__, alias)
+        return wrapper
+
+    def _terminate(self, wrapper):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)',
+                           [wrapper.connection.get_backend_pid()])
+
+    def test_health_check_replaces_dropped_connection(self):
+        wrapper = self._wrapper('health', CONN_MAX_AGE=60,
+                                CONN_HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        dropped = wrapper.connection
+        self._terminate(wrapper)
+
+        # Next request.
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIsNot(wrapper.connection, dropped)
+
+    def test_pool_lends_connection_per_request(self):
+        pool = {'MAX_SIZE': 1, 'TIMEOUT': 0.01}
+        first = self._wrapper('pool-test', POOL=pool)
+        second = self._wrapper('pool-test', POOL=pool)
+        first.ensure_connection()
+        raw = first.connection
+
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+
+        first.close_if_unusable_or_obsolete()
+        second.ensure_connection()
+
+        self.assertIs(second.connection, raw)
+        self.assertIsNone(first.connection)
+        second.close_if_unusable_or_obsolete()
+        stats = second._get_pool(second.get_connection_params()).stats()
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_pool_health_check_on_borrow(self):
+        pool = {'MAX_SIZE': 1}
+        wrapper = self._wrapper('pool-health', POOL=pool,
+                                CONN_HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        dropped = wrapper.connection
+        self._terminate(wrapper)
+        wrapper.close_if_unusable_or_obsolete()
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIsNot(wrapper.connection, dropped)
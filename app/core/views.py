@@ -0,0 +1,42 @@
+import ipaddress
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+
+from core.db.backends.postgresql.base import pool_stats
+from core.metrics import exposition
+
+
+def _is_internal(address: str) -> bool:
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.INTERNAL_IPS)
+
+
+def internal(view):
+    """Serve ``view`` only to clients in INTERNAL_IPS, 404 to others."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_internal(request.META.get('REMOTE_ADDR', '')):
+            raise Http404
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@internal
+def db_pool_stats(request):
+    """Connection pool statistics of the process serving the request."""
+    return JsonResponse({'pid': os.getpid(), 'pools': pool_stats()})
+
+
+@internal
+def metrics(request):
+    """Request metrics of all workers in the Prometheus text format."""
+    body, content_type = exposition()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,62 @@
+"""Gunicorn settings, tuned through the environment.
+
+SERVER_MODE=wsgi (default) serves app.wsgi with sync workers, or gthread
+workers when GUNICORN_THREADS > 1. SERVER_MODE=asgi serves app.asgi with
+uvicorn workers and async recipe list and detail views.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS',
+                             multiprocessing.cpu_count() * 2 + 1))
+# Ignored by ASGI workers, see RECIPE_ASYNC_THREADS instead.
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Restart workers now and then so leaks cannot build up.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+# Workers write their request metrics here, /metrics adds them up.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'recipe-metrics'))
+
+
+def on_starting(server):
+    # Each process has its own LRU cache, so a write handled by one worker
+    # would leave stale responses in the others.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    from django.conf import settings
+    if (server.cfg.workers > 1
+            and settings.RECIPE_CACHE['BACKEND'] == 'recipe.cache.LRUCache'):
+        raise RuntimeError(
+            'recipe.cache.LRUCache is per process: set '
+            'RECIPE_CACHE_BACKEND=recipe.cache.SharedCache to run '
+            f'{server.cfg.workers} workers')
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # The application is loaded by now: build the autocomplete index before
+    # the worker takes requests rather than on the first search.
+    from django.db import connections
+    from recipe import autocomplete
+    autocomplete.build_index()
+    connections.close_all()
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from core.metrics import serialization
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_ASYNC_THREADS,
+            thread_name_prefix='recipe-async',
+        )
+    return _executor
+
+
+def _handle(view, request, *args, **kwargs):
+    # Connections belong to the pool thread rather than to the request,
+    # so recycle them around each call like Django does per request.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            with serialization():
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Wrap a sync view into an async one for ASGI servers.
+
+    Under ASGI, Django runs every sync view on one thread per process, so
+    concurrent requests queue behind each other. The wrapped view runs in
+    a pool of RECIPE_ASYNC_THREADS threads instead, and leaves the event
+    loop free while the database answers.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(
+            _handle, thread_sensitive=False, executor=_get_executor(),
+        )(view, request, *args, **kwargs)
+
+    return wrapper
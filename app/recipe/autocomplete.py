@@ -0,0 +1,375 @@
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left, insort
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connections,
+    transaction,
+)
+from django.db.models.functions import Collate, Lower
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.changes import recipe_changes
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+
+# Changes read per query while catching up with the change feed.
+CATCH_UP_BATCH = 1000
+
+# Rows read per server-side cursor fetch when building the index.
+BUILD_BATCH = 10000
+
+
+def _entries(rows) -> list:
+    """Sorted (casefolded name, id, name) entries of (id, name) rows.
+
+    Names equal but for case are ordered by id, and a name comes before
+    the longer names it is a prefix of.
+    """
+    return sorted((name.casefold(), recipe_id, name)
+                  for recipe_id, name in rows)
+
+
+def _in_order(rows, rest: list):
+    """Entries of (id, name) rows that are already in entry order.
+
+    The others are appended to ``rest``: rows ordered by lower(name) are
+    in casefolded order but for the few names where both differ, like
+    'Straße'.
+    """
+    last = None
+    for recipe_id, name in rows:
+        entry = (name.casefold(), recipe_id, name)
+        if last is not None and entry < last:
+            rest.append(entry)
+        else:
+            last = entry
+            yield entry
+
+
+class PackedRun:
+    """Immutable sorted entries packed in one UTF-8 blob of names.
+
+    The i-th name is ``names[offsets[i]:offsets[i + 1]]`` and belongs to
+    recipe ``ids[i]``. That is about the length of the name plus 20 bytes
+    per recipe, with no Python object per recipe.
+    """
+
+    def __init__(self, entries=()):
+        names = bytearray()
+        offsets = array('I', [0])
+        ids = array('q')
+        for _, recipe_id, name in entries:
+            names += name.encode()
+            offsets.append(len(names))
+            ids.append(recipe_id)
+        self.names = bytes(names)
+        self.offsets = offsets
+        self.ids = ids
+        # For membership tests.
+        self.sorted_ids = np.sort(np.frombuffer(ids, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, recipe_id: int) -> bool:
+        position = np.searchsorted(self.sorted_ids, recipe_id)
+        return position < len(self.sorted_ids) and \
+            self.sorted_ids[position] == recipe_id
+
+    def name(self, position: int) -> str:
+        return self.names[self.offsets[position]:
+                          self.offsets[position + 1]].decode()
+
+    def entries(self, start: int = 0, hidden=frozenset()):
+        """Entries from ``start`` on, leaving out ``hidden`` ids."""
+        for position in range(start, len(self.ids)):
+            recipe_id = self.ids[position]
+            if recipe_id not in hidden:
+                name = self.name(position)
+                yield name.casefold(), recipe_id, name
+
+    def scan(self, prefix: str, hidden=frozenset()):
+        """Entries whose casefolded name starts with ``prefix``."""
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.name(middle).casefold() < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        for entry in self.entries(low, hidden):
+            if not entry[0].startswith(prefix):
+                return
+            yield entry
+
+
+def _scan(entries: list, prefix: str):
+    for entry in islice(entries, bisect_left(entries, (prefix,)), None):
+        if not entry[0].startswith(prefix):
+            return
+        yield entry
+
+
+class PrefixIndex:
+    """Recipe names searched by prefix, ignoring case.
+
+    Most entries live in a :class:`PackedRun`. Recent changes go to a small
+    sorted list of entries, with their names by id and the ids they hide in
+    the run, and searches merge both. Once the changes outgrow
+    ``compact_ratio`` of the run (and ``compact_min``) a background thread
+    merges them into a new run.
+
+    The state is replaced, never modified, so searches do not lock.
+    """
+
+    def __init__(self, rows=(), compact_min: int = 1000,
+                 compact_ratio: float = 1 / 64):
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        # (packed run, recent entries, their names by id, ids of the run
+        # they hide)
+        self._state = (PackedRun(_entries(rows)), [], {}, frozenset())
+        self._lock = threading.Lock()
+        self._compaction = threading.Lock()
+        self._compacting = False
+        # Batches applied while a compaction runs, None otherwise.
+        self._log = None
+
+    def __len__(self):
+        run, recent, _, hidden = self._state
+        return len(run) - len(hidden) + len(recent)
+
+    def update(self, upserts=(), removals=()):
+        """Apply a batch of (id, name) upserts and id removals.
+
+        The whole batch is applied under the lock at once, and searches see
+        all of it or none of it.
+        """
+        upserts = dict(upserts)
+        removals = list(removals)
+        with self._lock:
+            self._apply(upserts, removals)
+            if self._log is not None:
+                self._log.append((upserts, removals))
+            if not self._compacting and self._should_compact():
+                self._compacting = True
+                threading.Thread(target=self._compact_in_background,
+                                 name='autocomplete-compact',
+                                 daemon=True).start()
+
+    def upsert(self, recipe_id: int, name: str):
+        self.update(upserts=[(recipe_id, name)])
+
+    def remove(self, recipe_id: int):
+        self.update(removals=[recipe_id])
+
+    def search(self, prefix: str, limit: int) -> list:
+        """The first ``limit`` recipes whose name starts with ``prefix``,
+        ignoring case, ordered by name."""
+        prefix = prefix.casefold()
+        run, recent, _, hidden = self._state
+        matches = heapq.merge(run.scan(prefix, hidden), _scan(recent, prefix))
+        return [{'id': recipe_id, 'name': name}
+                for _, recipe_id, name in islice(matches, limit)]
+
+    def compact(self):
+        """Merge the recent entries into a new packed run."""
+        with self._compaction:
+            with self._lock:
+                run, recent, _, hidden = self._state
+                self._log = []
+            # Reads every entry: done without the lock, then the batches
+            # applied meanwhile are replayed onto the new run.
+            merged = PackedRun(
+                heapq.merge(run.entries(hidden=hidden), recent))
+            with self._lock:
+                log, self._log = self._log, None
+                self._state = (merged, [], {}, frozenset())
+                for upserts, removals in log:
+                    self._apply(upserts, removals)
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        finally:
+            self._compacting = False
+
+    def _apply(self, upserts: dict, removals: list):
+        run, recent, names, hidden = self._state
+        # Copies are cheap next to the run, and searches in progress keep
+        # reading the previous ones.
+        recent, names = recent.copy(), names.copy()
+        changed = upserts.keys() | set(removals)
+        for recipe_id in changed:
+            name = names.pop(recipe_id, None)
+            if name is not None:
+                del recent[bisect_left(
+                    recent, (name.casefold(), recipe_id, name))]
+        for entry in _entries(upserts.items()):
+            insort(recent, entry)
+            names[entry[1]] = entry[2]
+        hidden = hidden.union(
+            recipe_id for recipe_id in changed if recipe_id in run)
+        self._state = (run, recent, names, hidden)
+
+    def _should_compact(self) -> bool:
+        run, recent, _, hidden = self._state
+        return len(recent) + len(hidden) > max(
+            self.compact_min, len(run) * self.compact_ratio)
+
+
+def _ordered_rows():
+    """(id, name) rows of every recipe, ordered by lower(name) and id.
+
+    Names are compared by code point like Python strings do, which is the
+    "C" collation on Postgres and the default one on SQLite.
+    """
+    recipes = Recipe.objects.all()
+    key = Lower('name')
+    if connections[recipes.db].vendor == 'postgresql':
+        key = Collate(key, 'C')
+    return recipes.order_by(key, 'id') \
+        .values_list('id', 'name').iterator(BUILD_BATCH)
+
+
+class RecipeNameIndex(PrefixIndex):
+    """Prefix index of the recipes of ``core_recipe``, kept current.
+
+    The run is packed straight from the rows of the table in name order,
+    without sorting them in Python. Writes made in this process are
+    applied as they commit, and a background thread reads the change feed
+    every ``refresh`` seconds to pick up those of other processes. They
+    show up after RECIPE_CHANGES_DELAY seconds, like for any feed
+    consumer. A ``refresh`` of 0 leaves them out.
+    """
+
+    def __init__(self, refresh: float, delay: float):
+        super().__init__()
+        # Changes older than the horizon are in the table by now: read the
+        # feed from there on.
+        horizon = timezone.now() - timedelta(seconds=delay)
+        rest = []
+        run = PackedRun(_in_order(_ordered_rows(), rest))
+        self._state = (run, [], {}, frozenset())
+        self.update(upserts=[(recipe_id, name)
+                             for _, recipe_id, name in rest])
+        self.refresh = refresh
+        self.delay = delay
+        self._position = (horizon, 0)
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start catching up in the background, every ``refresh``
+        seconds."""
+        if self.refresh:
+            threading.Thread(target=self._catch_up_every_refresh,
+                             name='autocomplete-catch-up',
+                             daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _catch_up_every_refresh(self):
+        while not self._stopped.wait(self.refresh):
+            # Connections of this thread are recycled like a request's.
+            close_old_connections()
+            try:
+                self.catch_up()
+            except DatabaseError:
+                logger.exception('Autocomplete index catch up failed')
+            finally:
+                close_old_connections()
+
+    def catch_up(self):
+        """Apply the changes of the feed since the last catch up."""
+        has_more = True
+        while has_more:
+            changes, self._position, has_more = recipe_changes(
+                self._position, CATCH_UP_BATCH, self.delay,
+                fields=('id', 'name'))
+            self.update(
+                upserts=[(change['id'], change['recipe']['name'])
+                         for change in changes if not change['deleted']],
+                removals=[change['id']
+                          for change in changes if change['deleted']],
+            )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_index() -> RecipeNameIndex:
+    """Build the index of this process if it is not built yet.
+
+    Called when a worker starts (see gunicorn.conf.py), so that requests
+    do not wait for it.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RecipeNameIndex(
+                    settings.RECIPE_AUTOCOMPLETE_REFRESH,
+                    settings.RECIPE_CHANGES_DELAY)
+                _index.start()
+    return _index
+
+
+def get_index() -> RecipeNameIndex:
+    return build_index()
+
+
+def reset_index():
+    """Drop the index, the next search builds it again."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.stop()
+        _index = None
+
+
+@receiver(setting_changed)
+def _reset_index(setting, **kwargs):
+    if setting in ('RECIPE_AUTOCOMPLETE_REFRESH', 'RECIPE_CHANGES_DELAY'):
+        reset_index()
+
+
+def _apply(update):
+    index = _index
+    # Not built yet in this process: it will read the table anyway.
+    if index is not None:
+        transaction.on_commit(lambda: update(index))
+
+
+def recipe_saved(recipe_id: int, name: str):
+    _apply(lambda index: index.upsert(recipe_id, name))
+
+
+def recipe_deleted(recipe_id: int):
+    _apply(lambda index: index.remove(recipe_id))
+
+
+def recipes_written(recipe_ids):
+    """Reindex recipes written without model signals."""
+    recipe_ids = list(recipe_ids)
+
+    def update(index):
+        index.update(upserts=Recipe.objects.filter(id__in=recipe_ids)
+                     .values_list('id', 'name'))
+
+    _apply(update)
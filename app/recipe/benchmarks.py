@@ -0,0 +1,58 @@
+import math
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from core.models import Recipe
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list of samples."""
+    if not samples:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(samples)), 1)
+    return samples[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary, in milliseconds, of a list of durations in seconds."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(total / len(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+@contextmanager
+def timed(samples: list):
+    """Append the wall time of the wrapped block to ``samples``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append(time.perf_counter() - start)
+
+
+def grow_recipes(size: int) -> int:
+    """Insert placeholder recipes named 'Recipe <md5 of their number>'
+    until core_recipe has ``size`` rows, and return the number of rows."""
+    rows = Recipe.objects.count()
+    if rows < size:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO core_recipe (name, description, "
+                "ingredient_names, created_at, updated_at) "
+                "SELECT 'Recipe ' || md5(g::text), 'Benchmark recipe', "
+                "'[]', now(), now() "
+                "FROM generate_series(%s, %s) AS g",
+                [rows + 1, size],
+            )
+            cursor.execute('ANALYZE core_recipe')
+        rows = size
+    return rows
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+LIST_VERSION_KEY = 'recipes:version'
+
+
+class LRUCache:
+    """In-process LRU cache whose entries expire after ``timeout`` seconds.
+
+    Each worker process keeps its own copy, so invalidations only reach
+    the process that handled the write. Use :class:`SharedCache` when
+    running more than one worker.
+    """
+
+    def __init__(self, max_entries: int = 10000, timeout: int = 60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+    def set_many(self, mapping: dict):
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCache:
+    """Cache kept in one of the Django ``CACHES``, shared by all workers."""
+
+    def __init__(self, alias: str = 'default', timeout: int = 60):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, value):
+        self._cache.set(key, value, self.timeout)
+
+    def set_many(self, mapping: dict):
+        self._cache.set_many(mapping, self.timeout)
+
+    def clear(self):
+        self._cache.clear()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        config = settings.RECIPE_CACHE
+        _cache = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _cache
+
+
+@receiver(setting_changed)
+def _reset_cache(setting, **kwargs):
+    global _cache
+    if setting == 'RECIPE_CACHE':
+        _cache = None
+
+
+def _version_key(recipe_id: int) -> str:
+    return f'recipe:{recipe_id}:version'
+
+
+def _new_version() -> str:
+    # Prefixed with the time of the change, see _settled.
+    return f'{time.time():.3f}-{uuid4().hex}'
+
+
+def _version(cache, key: str) -> str:
+    version = cache.get(key)
+    if version is None:
+        # Whatever changed it is unknown, treat it as a fresh change.
+        version = _new_version()
+        cache.set(key, version)
+    return version
+
+
+def _settled(version: str, settle: float) -> bool:
+    try:
+        changed_at = float(version.split('-', 1)[0])
+    except ValueError:
+        # Written before versions carried their time.
+        return False
+    return time.time() - changed_at >= settle
+
+
+def _response_key(cache, request, recipe_id=None) -> tuple:
+    """Key and version of a response, tied to what it depends on.
+
+    Detail responses depend on a single recipe, every other response may
+    contain any recipe and depends on the version of the whole list.
+    """
+    if recipe_id is None:
+        scope = 'recipes'
+        version = _version(cache, LIST_VERSION_KEY)
+    else:
+        scope = f'recipe:{recipe_id}'
+        version = _version(cache, _version_key(recipe_id))
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'{scope}:{version}:{url}', version
+
+
+def _etag(data) -> str:
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'"{hashlib.md5(content.encode()).hexdigest()}"'
+
+
+def cached_response(request, render, recipe_id=None,
+                    settle: float = 0) -> Response:
+    """Serve a GET response from the cache, rendering it on a miss.
+
+    Responses carry an ETag. A request whose ``If-None-Match`` matches a
+    cached entry gets a 304 without touching the database. Responses
+    served from the cache have ``from_cache`` set.
+
+    ``render`` may miss changes made less than ``settle`` seconds ago, for
+    example when it reads from a replica. What it renders that soon after
+    a change is served but not cached.
+    """
+    cache = get_cache()
+    key, version = _response_key(cache, request, recipe_id)
+    entry = cache.get(key)
+    from_cache = entry is not None
+    if entry is None:
+        response = render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = (_etag(response.data), response.data)
+        if not settle or _settled(version, settle):
+            cache.set(key, entry)
+
+    etag, data = entry
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+    else:
+        response = Response(data, headers={'ETag': etag})
+    response.from_cache = from_cache
+    return response
+
+
+def _invalidate(recipe_ids: list):
+    version = _new_version()
+    keys = [LIST_VERSION_KEY] + [_version_key(pk) for pk in recipe_ids]
+    get_cache().set_many(dict.fromkeys(keys, version))
+
+
+def invalidate_recipes(recipe_ids):
+    """Drop cached lists and the cached details of the given recipes.
+
+    Inside a transaction the entries are dropped again on commit, so a
+    read that raced with the write cannot leave stale data behind.
+    """
+    recipe_ids = list(recipe_ids)
+    _invalidate(recipe_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _invalidate(recipe_ids))
@@ -0,0 +1,127 @@
+import base64
+import binascii
+from datetime import datetime, timedelta
+
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.models import Recipe, RecipeTombstone
+from recipe.serializers import (
+    RECIPE_FIELDS,
+    recipe_columns,
+    serialize_recipes,
+)
+
+_timestamp = serializers.DateTimeField()
+
+# Start of the oldest transaction of another session that has written
+# something and is not committed yet. Activity is otherwise read once per
+# transaction.
+OLDEST_WRITE_SQL = """
+SELECT pg_stat_clear_snapshot();
+SELECT min(xact_start) FROM pg_stat_activity
+WHERE backend_xid IS NOT NULL
+  AND datname = current_database()
+  AND pid <> pg_backend_pid()
+"""
+
+
+def encode_cursor(changed_at: datetime, recipe_id: int) -> str:
+    value = f'{changed_at.isoformat()},{recipe_id}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return the ``(changed_at, recipe_id)`` position of a cursor.
+
+    Raises ValueError for cursors not made by `encode_cursor`.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeError):
+        raise ValueError('malformed cursor')
+    changed_at, recipe_id = value.rsplit(',', 1)
+    changed_at = datetime.fromisoformat(changed_at)
+    if timezone.is_naive(changed_at):
+        raise ValueError('cursor without time zone')
+    return changed_at, int(recipe_id)
+
+
+def _after(field: str, id_field: str, position) -> Q:
+    if position is None:
+        return Q()
+    changed_at, recipe_id = position
+    # (field, id) > position, with a plain lower bound on field first so
+    # it can start a range scan on the (field, id) index.
+    return Q(**{f'{field}__gte': changed_at}) & (
+        Q(**{f'{field}__gt': changed_at}) | Q(**{f'{id_field}__gt': recipe_id})
+    )
+
+
+def change_horizon(delay: float) -> datetime:
+    """Time up to which changes are committed and may be returned.
+
+    That is ``delay`` seconds ago, or on Postgres the start of the oldest
+    uncommitted write transaction on the primary if that is earlier: its
+    changes are stamped after it started and may commit any time later.
+    ``delay`` covers the time between stamping a change and the
+    transaction taking a transaction id, and clock drift between hosts.
+    """
+    horizon = timezone.now() - timedelta(seconds=delay)
+    connection = connections[router.db_for_write(Recipe)]
+    if connection.vendor != 'postgresql':
+        return horizon
+    with connection.cursor() as cursor:
+        cursor.execute(OLDEST_WRITE_SQL)
+        oldest, = cursor.fetchone()
+    return horizon if oldest is None else min(horizon, oldest)
+
+
+def recipe_changes(position, limit: int, delay: float,
+                   fields=RECIPE_FIELDS) -> tuple:
+    """Changes after ``position``, oldest first, and whether there are more.
+
+    Live recipes come with their ``fields``, which must include ``id``.
+
+    Live recipes and tombstones are each read in ``(timestamp, id)`` order
+    through their keyset index and merged, so a page costs two index range
+    scans however large the catalogue is. Changes after `change_horizon`
+    are held back until concurrent writes are committed.
+    """
+    horizon = change_horizon(delay)
+    recipes = (
+        Recipe.objects
+        .filter(_after('updated_at', 'id', position),
+                updated_at__lte=horizon)
+        .order_by('updated_at', 'id')
+        .values('updated_at', *recipe_columns(fields))[:limit + 1]
+    )
+    tombstones = (
+        RecipeTombstone.objects
+        .filter(_after('deleted_at', 'recipe_id', position),
+                deleted_at__lte=horizon)
+        .order_by('deleted_at', 'recipe_id')
+        .values_list('deleted_at', 'recipe_id')[:limit + 1]
+    )
+
+    rows = [(row['updated_at'], row['id'], row) for row in recipes]
+    rows += [(deleted_at, recipe_id, None)
+             for deleted_at, recipe_id in tombstones]
+    rows.sort(key=lambda row: row[:2])
+    page = rows[:limit]
+
+    live = iter(serialize_recipes((row for _, _, row in page if row),
+                                  fields))
+    changes = [
+        {
+            'id': recipe_id,
+            'changed_at': _timestamp.to_representation(changed_at),
+            'deleted': row is None,
+            'recipe': None if row is None else next(live),
+        }
+        for changed_at, recipe_id, row in page
+    ]
+    last = page[-1][:2] if page else position
+    return changes, last, len(rows) > limit
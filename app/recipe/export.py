@@ -0,0 +1,31 @@
+import json
+from itertools import islice
+
+from recipe.serializers import (
+    RECIPE_FIELDS,
+    recipe_columns,
+    serialize_recipes,
+)
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_recipes(queryset, chunk_size: int, fields=RECIPE_FIELDS):
+    """Yield recipes with their ingredients as NDJSON.
+
+    Recipes, ingredients included, are read from the recipe table alone
+    through a server-side cursor and written out in chunks of
+    ``chunk_size`` lines, so memory use does not depend on the size of the
+    catalogue.
+    """
+    rows = queryset.values(*recipe_columns(fields)) \
+        .iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        yield ''.join(_dumps(recipe) + '\n'
+                      for recipe in serialize_recipes(chunk, fields))
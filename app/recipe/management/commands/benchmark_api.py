@@ -0,0 +1,189 @@
+import json
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.management.commands.seed_recipes import (
+    DISHES,
+    STYLES,
+    catalogue,
+    generate_recipes,
+)
+from core.models import Recipe
+from recipe import autocomplete
+from recipe.benchmarks import summarize
+
+SCENARIOS = ('list', 'detail', 'search', 'autocomplete', 'create', 'update',
+             'delete')
+
+# Every response is rendered: an LRU cache of size 0 never keeps any.
+NO_CACHE = {'BACKEND': 'recipe.cache.LRUCache',
+            'OPTIONS': {'max_entries': 0}}
+
+
+def _payload(record) -> str:
+    name, description, ingredients = record
+    return json.dumps({
+        'name': name,
+        'description': description,
+        'ingredients': [{'name': ingredient} for ingredient in ingredients],
+    })
+
+
+class Command(BaseCommand):
+    help = ('Time list, detail, search, autocomplete, create, update and '
+            'delete requests sent through the URL routing, middleware and '
+            'views in process. Prints one JSON line per scenario with '
+            'throughput, latency percentiles and queries per request. Runs '
+            'in a transaction that is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Seed synthetic recipes until the table has this many.')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Timed requests per scenario.')
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Untimed requests per scenario sent first.')
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help='Comma separated scenarios to run.')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Keep the recipe response cache on. By default every '
+                 'response is rendered from the database.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--label', default='',
+            help='Added to every result, e.g. the commit under test.')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios).difference(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f'Unknown scenarios: {", ".join(sorted(unknown))}.')
+
+        overrides = {
+            'ALLOWED_HOSTS': ['testserver'],
+            'DATABASE_REPLICAS': [],
+        }
+        if not options['cache']:
+            overrides['RECIPE_CACHE'] = NO_CACHE
+
+        # The autocomplete index is built from the seeded table and must
+        # not outlive the rollback.
+        autocomplete.reset_index()
+        try:
+            self._benchmark(scenarios, overrides, options)
+        finally:
+            autocomplete.reset_index()
+
+    def _benchmark(self, scenarios: list, overrides: dict, options: dict):
+        with override_settings(**overrides), transaction.atomic():
+            recipes = self._seed(options['recipes'], options['seed'])
+            self.rng = random.Random(options['seed'])
+            self.records = generate_recipes(
+                random.Random(options['seed'] + 1), catalogue(1000))
+            self.ids = list(
+                Recipe.objects.order_by('-id')
+                .values_list('id', flat=True)[:100000])
+            self.created = []
+            self.client = Client()
+            self.page_size = options['page_size']
+
+            for scenario in scenarios:
+                result = self._run(getattr(self, f'_{scenario}'),
+                                   options['warmup'], options['requests'])
+                result.update({'label': options['label'],
+                               'scenario': scenario, 'recipes': recipes})
+                self.stdout.write(json.dumps(result))
+            transaction.set_rollback(True)
+
+    def _seed(self, size: int, seed: int) -> int:
+        rows = Recipe.objects.count()
+        if rows < size:
+            call_command('seed_recipes', size - rows, seed=seed,
+                         stdout=self.stderr)
+            rows = size
+        return rows
+
+    def _run(self, request, warmup: int, requests: int) -> dict:
+        for _ in range(warmup):
+            request()
+
+        queries = []
+        samples = []
+        errors = 0
+
+        def count(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            for _ in range(requests):
+                queries.append(0)
+                start = time.perf_counter()
+                response = request()
+                samples.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+            elapsed = time.perf_counter() - started
+
+        result = summarize(samples)
+        result.update({
+            'requests_per_s': round(requests / elapsed, 1),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'errors': errors,
+        })
+        return result
+
+    def _list(self):
+        return self.client.get(reverse('recipe:recipe-list'),
+                               {'page_size': self.page_size})
+
+    def _detail(self):
+        return self.client.get(reverse('recipe:recipe-detail',
+                                       args=[self.rng.choice(self.ids)]))
+
+    def _search(self):
+        return self.client.get(reverse('recipe:recipe-list'), {
+            'name': self.rng.choice(DISHES),
+            'page_size': self.page_size,
+        })
+
+    def _autocomplete(self):
+        name = f'{self.rng.choice(STYLES)} {self.rng.choice(DISHES)}'
+        return self.client.get(reverse('recipe:recipe-autocomplete'), {
+            'q': name[:self.rng.randint(1, len(name))],
+        })
+
+    def _create(self):
+        response = self.client.post(reverse('recipe:recipe-list'),
+                                    _payload(next(self.records)),
+                                    content_type='application/json')
+        if response.status_code == 201:
+            self.created.append(response.json()['id'])
+        return response
+
+    def _update(self):
+        return self.client.patch(
+            reverse('recipe:recipe-detail', args=[self.rng.choice(self.ids)]),
+            _payload(next(self.records)), content_type='application/json')
+
+    def _delete(self):
+        # Created recipes first, so reads keep finding the seeded ones.
+        pk = self.created.pop() if self.created else self.ids.pop()
+        return self.client.delete(
+            reverse('recipe:recipe-detail', args=[pk]))
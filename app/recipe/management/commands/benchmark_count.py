@@ -0,0 +1,86 @@
+import hashlib
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Recipe
+from recipe.benchmarks import grow_recipes, summarize, timed
+from recipe.pagination import estimate_count
+
+
+class Command(BaseCommand):
+    help = ('Compare the cost of ?count=exact and ?count=estimated with '
+            'the cost of the page they are added to, on the whole table '
+            'and on ?name= searches, while core_recipe grows. Runs in a '
+            'transaction that is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='10000,100000,1000000,10000000',
+            help='Comma separated table sizes to measure at.')
+        parser.add_argument(
+            '--queries', type=int, default=20,
+            help='Requests to time per size, filter and mode.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('benchmark_count needs PostgreSQL.')
+
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        limit = settings.REST_FRAMEWORK['PAGE_SIZE'] + 1
+
+        with transaction.atomic():
+            for size in sizes:
+                rows = grow_recipes(size)
+                for name, querysets in self._filters(rng, rows,
+                                                     options['queries']):
+                    for mode in ('page', 'exact', 'estimated'):
+                        result = self._measure(mode, querysets, limit)
+                        result.update(
+                            {'rows': rows, 'filter': name, 'mode': mode})
+                        self.stdout.write(json.dumps(result))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _filters(rng: random.Random, rows: int, count: int):
+        """Yield querysets of the unfiltered list, of searches matching a
+        few recipes and of searches matching about 1 in 128."""
+        digests = [
+            hashlib.md5(str(rng.randint(1, rows)).encode()).hexdigest()
+            for _ in range(count)
+        ]
+        yield 'none', [Recipe.objects.all()] * count
+        yield 'selective', [Recipe.objects.filter(name__contains=digest[:6])
+                            for digest in digests]
+        yield 'broad', [Recipe.objects.filter(name__contains=digest[:2])
+                        for digest in digests]
+
+    @staticmethod
+    def _measure(mode: str, querysets: list, limit: int) -> dict:
+        samples = []
+        counts = []
+        errors = []
+        for queryset in querysets:
+            with timed(samples):
+                if mode == 'page':
+                    list(queryset.order_by('-id')[:limit])
+                elif mode == 'exact':
+                    counts.append(queryset.count())
+                else:
+                    counts.append(estimate_count(queryset))
+            if mode == 'estimated':
+                actual = queryset.count()
+                errors.append(abs(counts[-1] - actual) / max(actual, 1))
+
+        result = summarize(samples)
+        if counts:
+            result['mean_count'] = round(sum(counts) / len(counts))
+        if errors:
+            result['mean_relative_error'] = round(
+                sum(errors) / len(errors), 3)
+        return result
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Recipe
+from recipe.benchmarks import grow_recipes, summarize, timed
+
+LOOKUPS = {
+    'name': 'name__contains',
+    'iname': 'name__icontains',
+}
+
+
+class Command(BaseCommand):
+    help = ('Measure ?name= and ?iname= search latency while core_recipe '
+            'grows. Runs in a transaction that is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='10000,100000,1000000,10000000',
+            help='Comma separated table sizes to measure at.')
+        parser.add_argument(
+            '--queries', type=int, default=200,
+            help='Searches to time per size and lookup.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('benchmark_search needs PostgreSQL.')
+
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        limit = settings.REST_FRAMEWORK['PAGE_SIZE'] + 1
+
+        with transaction.atomic():
+            for size in sizes:
+                rows = grow_recipes(size)
+                tokens = self._tokens(rng, rows, options['queries'])
+                for param, lookup in LOOKUPS.items():
+                    result = self._measure(lookup, tokens, limit)
+                    result.update({'rows': rows, 'param': param})
+                    self.stdout.write(json.dumps(result))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _tokens(rng: random.Random, rows: int, count: int) -> list:
+        tokens = []
+        for _ in range(count):
+            value = str(rng.randint(1, rows)).encode()
+            digest = hashlib.md5(value).hexdigest()
+            start = rng.randint(0, len(digest) - 6)
+            tokens.append(digest[start:start + 6])
+        return tokens
+
+    @staticmethod
+    def _measure(lookup: str, tokens: list, limit: int) -> dict:
+        samples = []
+        for token in tokens:
+            queryset = Recipe.objects.filter(**{lookup: token})
+            with timed(samples):
+                list(queryset.order_by('-id')[:limit])
+
+        plan = Recipe.objects.filter(**{lookup: tokens[0]}) \
+            .order_by('-id')[:limit].explain()
+        result = summarize(samples)
+        result['uses_trigram_index'] = '_trgm' in plan
+        return result
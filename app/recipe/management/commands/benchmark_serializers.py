@@ -0,0 +1,78 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, RecipeIngredient
+from recipe.serializers import (
+    RECIPE_COLUMNS,
+    RecipeSerializer,
+    prefetch_ingredients,
+    serialize_recipes,
+)
+
+INGREDIENTS_PER_RECIPE = 8
+
+
+class Command(BaseCommand):
+    help = ('Compare recipes serialized per second by RecipeSerializer and '
+            'by the serialize_recipes fast path. Runs in a transaction '
+            'that is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000',
+            help='Comma separated numbers of recipes to serialize.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        renderer = JSONRenderer()
+
+        with transaction.atomic():
+            for size in sizes:
+                self._grow_to(size)
+                recipes = Recipe.objects.order_by('-id')[:size]
+
+                start = time.perf_counter()
+                current = renderer.render(RecipeSerializer(
+                    recipes.prefetch_related(prefetch_ingredients()),
+                    many=True).data)
+                current_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                fast = renderer.render(
+                    serialize_recipes(recipes.values(*RECIPE_COLUMNS)))
+                fast_time = time.perf_counter() - start
+
+                if current != fast:
+                    raise CommandError(
+                        f'Outputs differ for {size} recipes.')
+                self.stdout.write(json.dumps({
+                    'recipes': size,
+                    'serializer_per_s': round(size / current_time),
+                    'fast_path_per_s': round(size / fast_time),
+                    'speedup': round(current_time / fast_time, 2),
+                }))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _grow_to(size: int):
+        missing = size - Recipe.objects.count()
+        if missing <= 0:
+            return
+        names = [f'ingredient {n}' for n in range(INGREDIENTS_PER_RECIPE)]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'Recipe {i}', description='Benchmark recipe',
+                   ingredient_names=names)
+            for i in range(missing)
+        )
+        ids = Ingredient.objects.ids_for(names)
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe=recipe, position=position,
+                              ingredient_id=ids[name])
+             for recipe in recipes
+             for position, name in enumerate(names)),
+            batch_size=10000,
+        )
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import RecipeIngredient, RecipeSimilarity
+from recipe.similarity import (
+    IngredientMatrix,
+    compute_neighbours,
+    load_links,
+    store_neighbours,
+)
+
+
+class Command(BaseCommand):
+    help = ('Rank the most similar recipes of every recipe by the Jaccard '
+            'similarity of their ingredients and store them for '
+            '/api/recipes/<id>/similar/. The ingredient links are loaded '
+            'into a sparse matrix and its rows are compared with all the '
+            'others in chunks, spread over worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=settings.RECIPE_SIMILAR_COUNT,
+            help='Similar recipes stored for each recipe.')
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            '--chunk-pairs', type=int, default=20_000_000,
+            help='Recipe pairs compared per chunk, which bounds the memory '
+                 'used by each process.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        matrix = IngredientMatrix(load_links())
+        self.stdout.write(
+            f'Loaded {len(matrix)} recipes in '
+            f'{time.monotonic() - started:.1f}s.')
+
+        recipes = pairs = 0
+        chunks = compute_neighbours(matrix, options['count'],
+                                    options['chunk_pairs'],
+                                    options['processes'])
+        for chunk in chunks:
+            store_neighbours(*chunk)
+            recipes += len(chunk[0])
+            pairs += len(chunk[1])
+            elapsed = max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f'{recipes} recipes, {pairs} similar recipes '
+                f'({recipes / elapsed:.0f} recipes/s)')
+
+        # Recipes that lost all their ingredients since the last run.
+        RecipeSimilarity.objects.exclude(
+            recipe_id__in=RecipeIngredient.objects.values('recipe_id')
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {pairs} similar recipes for {recipes} recipes.'))
@@ -0,0 +1,95 @@
+import http.client
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.benchmarks import summarize
+
+
+class Command(BaseCommand):
+    help = ('Send GET requests to a running server from concurrent clients '
+            'and print throughput and latency percentiles as JSON lines, '
+            'one per path and concurrency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_url', help='Server to test, e.g. http://localhost:8000')
+        parser.add_argument(
+            '--paths', default='/api/recipes/,/api/recipes/1/',
+            help='Comma separated paths to request.')
+        parser.add_argument(
+            '--concurrency', default='1,8,32',
+            help='Comma separated numbers of concurrent clients.')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to run each path and concurrency for.')
+        parser.add_argument(
+            '--bust-cache', action='store_true',
+            help='Add a unique query parameter to every request so that '
+                 'responses are never served from the recipe cache.')
+        parser.add_argument(
+            '--label', default='',
+            help='Added to every result, e.g. the server mode under test.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('base_url must be an http:// URL.')
+
+        for path in options['paths'].split(','):
+            for concurrency in options['concurrency'].split(','):
+                result = self._run(url, path, int(concurrency),
+                                   options['duration'], options['bust_cache'])
+                result.update({'label': options['label'], 'path': path,
+                               'concurrency': int(concurrency)})
+                self.stdout.write(json.dumps(result))
+
+    @staticmethod
+    def _run(url, path: str, concurrency: int, duration: float,
+             bust_cache: bool) -> dict:
+        samples = []
+        errors = []
+        counter = itertools.count()
+        separator = '&' if '?' in path else '?'
+        deadline = time.monotonic() + duration
+
+        def client():
+            connection = http.client.HTTPConnection(
+                url.hostname, url.port or 80, timeout=30)
+            while time.monotonic() < deadline:
+                target = path
+                if bust_cache:
+                    target = f'{path}{separator}_load={next(counter)}'
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', target)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(type(e).__name__)
+                    connection.close()
+                    continue
+                samples.append(time.perf_counter() - start)
+                if response.status != 200:
+                    errors.append(response.status)
+            connection.close()
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client)
+                   for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        result = summarize(samples)
+        result.update({
+            'requests_per_s': round(len(samples) / elapsed, 1),
+            'errors': len(errors),
+        })
+        return result
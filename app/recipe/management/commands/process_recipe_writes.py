@@ -0,0 +1,68 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipe.writes import drain
+
+
+def _work(applied, batch_size: int, poll_interval: float, once: bool):
+    try:
+        count = drain(batch_size, poll_interval, once)
+        with applied.get_lock():
+            applied.value += count
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Apply the recipe creates and updates queued by requests sent '
+            'with "Prefer: respond-async". Each worker process takes the '
+            'oldest pending writes in batches and applies every batch in '
+            'one transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Writes applied per transaction.')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit as soon as the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker_args = (options['batch_size'], options['poll_interval'],
+                       options['once'])
+        if options['processes'] <= 1:
+            applied = drain(*worker_args)
+        else:
+            applied = self._run_workers(options['processes'], worker_args)
+
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} writes.'))
+
+    @staticmethod
+    def _run_workers(processes: int, worker_args: tuple) -> int:
+        # Forked workers must open their own connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        applied = context.Value('q', 0)
+        workers = [
+            context.Process(target=_work, args=(applied, *worker_args),
+                            name=f'recipe-writes-{number}')
+            for number in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Batches being applied roll back and stay pending.
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        return applied.value
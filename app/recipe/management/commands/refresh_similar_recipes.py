@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.similarity import drain
+
+
+class Command(BaseCommand):
+    help = ('Refresh the similar recipes of the recipes whose ingredients '
+            'were written through the API, queued in '
+            'core_recipesimilarityrefresh. Batches of queued recipes are '
+            'refreshed together, reading the recipes that share an '
+            'ingredient with them once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=settings.RECIPE_SIMILAR_COUNT,
+            help='Similar recipes stored for each recipe.')
+        parser.add_argument(
+            '--max-ingredient-recipes', type=int,
+            default=settings.RECIPE_SIMILAR_MAX_INGREDIENT_RECIPES,
+            help='Ingredients used by more recipes than this do not bring '
+                 'in candidates on their own. 0 compares every recipe '
+                 'sharing an ingredient.')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Queued recipes refreshed per transaction.')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit as soon as the queue is empty.')
+
+    def handle(self, *args, **options):
+        refreshed = drain(options['batch_size'], options['count'],
+                          options['poll_interval'], options['once'],
+                          options['max_ingredient_recipes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {refreshed} queued recipes.'))
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+COUNT_MODES = ('none', 'exact', 'estimated')
+
+
+def estimate_count(queryset):
+    """Rows the query planner expects ``queryset`` to return.
+
+    Costs one EXPLAIN, planned from the table statistics without reading
+    any row. None on databases other than PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination on the recipe primary key.
+
+    Every page is fetched with an indexed ``id < cursor`` lookup, so deep
+    pages cost the same as the first one.
+
+    ``?count=`` adds the total number of results to the page. ``exact``
+    runs a COUNT(*), which reads every matching row. ``estimated`` takes
+    the estimate of the query planner and only counts exactly when it is
+    below RECIPE_EXACT_COUNT_BELOW rows.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count, self.count_exact = self.get_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset, request) -> tuple:
+        """Return the count of results asked for and whether it is exact."""
+        mode = request.query_params.get(self.count_query_param, 'none')
+        if mode not in COUNT_MODES:
+            raise ValidationError({self.count_query_param: [
+                f'Expected one of {", ".join(COUNT_MODES)}.'
+            ]})
+        if mode == 'none':
+            return None, None
+        if mode == 'estimated':
+            estimate = estimate_count(queryset)
+            if estimate is not None and \
+                    estimate >= settings.RECIPE_EXACT_COUNT_BELOW:
+                return estimate, False
+        return queryset.count(), True
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = OrderedDict([
+                ('count', self.count),
+                ('count_exact', self.count_exact),
+                *response.data.items(),
+            ])
+        return response
@@ -1,17 +1,144 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from django.db import models, transaction
 from rest_framework import serializers
 
-from core.models import Ingredient, Recipe
+from core.metrics import serialization
+from core.models import Ingredient, Recipe, RecipeIngredient
+from core.signals import recipes_changed
+from recipe.similarity import recipes_edited
+
+
+# Order of the ingredients of a recipe, from the catalogue side.
+LINK_ORDER = ('recipe_ingredients__position', 'recipe_ingredients__id')
+
+
+def prefetch_ingredients():
+    """Prefetch the ingredients of recipes in their listed order."""
+    return models.Prefetch(
+        'ingredients',
+        queryset=Ingredient.objects.order_by(*LINK_ORDER),
+    )
+
+
+class IngredientListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        # Catalogue rows have no order of their own within a recipe: list
+        # them in link order, unless they were already prefetched that way.
+        if isinstance(data, models.Manager):
+            prefetched = getattr(
+                data.instance, '_prefetched_objects_cache', {})
+            if data.prefetch_cache_name not in prefetched:
+                data = data.order_by(*LINK_ORDER)
+        return super().to_representation(data)
 
 
 class IngredientSerializers(serializers.ModelSerializer):
+    # Declared explicitly: submitted names may already be in the catalogue,
+    # so the unique validator of the model field must not apply.
+    name = serializers.CharField(max_length=255)
+
     class Meta:
         model = Ingredient
         fields = ('name',)
+        list_serializer_class = IngredientListSerializer
+
+
+def _link_ingredients(links):
+    """Insert (recipe, position, ingredient name) links in bulk.
+
+    Catalogue entries are upserted for all names at once, so the number
+    of queries does not depend on the number of links.
+    """
+    links = list(links)
+    if not links:
+        return
+    ids = Ingredient.objects.ids_for(name for _, _, name in links)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, position=position,
+                         ingredient_id=ids[name])
+        for recipe, position, name in links
+    )
+
+
+def _names(ingredients) -> list:
+    return [ingredient['name'] for ingredient in ingredients]
 
 
 def _create_ingredients(recipe: Recipe, ingredients=[]):
-    for ingredient in ingredients:
-        Ingredient.objects.create(recipe=recipe, name=ingredient['name'])
+    _link_ingredients(
+        (recipe, position, ingredient['name'])
+        for position, ingredient in enumerate(ingredients))
+
+
+def _replace_ingredients(recipe: Recipe, ingredients) -> bool:
+    """Sync the stored ingredients of a recipe with the submitted ones and
+    return whether an ingredient was added or removed.
+
+    Stored links are matched to the submitted names, the first stored link
+    of a name with its first submitted occurrence. Matched links are left
+    untouched unless their position changed, in which case only the
+    position is updated. Removed ingredients are deleted and new ones are
+    inserted.
+    """
+    links = recipe.recipe_ingredients.order_by('position', 'id') \
+        .values_list('id', 'position', 'ingredient__name')
+    stored = defaultdict(list)
+    for link_id, position, name in links:
+        stored[name].append((link_id, position))
+
+    moved = []
+    added = []
+    for position, name in enumerate(_names(ingredients)):
+        if stored[name]:
+            link_id, old_position = stored[name].pop(0)
+            if old_position != position:
+                moved.append(RecipeIngredient(id=link_id, position=position))
+        else:
+            added.append((recipe, position, name))
+
+    removed = [link_id for unmatched in stored.values()
+               for link_id, _ in unmatched]
+    if removed:
+        RecipeIngredient.objects.filter(id__in=removed).delete()
+    if moved:
+        RecipeIngredient.objects.bulk_update(moved, ['position'])
+    _link_ingredients(added)
+    return bool(removed or added)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Creates a batch of recipes with a fixed number of statements."""
+
+    @transaction.atomic
+    def create(self, validated_data):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=item['name'], description=item['description'],
+                   ingredient_names=_names(item['ingredients']))
+            for item in validated_data
+        )
+        _link_ingredients(
+            (recipe, position, name)
+            for recipe in recipes
+            for position, name in enumerate(recipe.ingredient_names)
+        )
+        recipe_ids = [recipe.id for recipe in recipes]
+        recipes_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+        recipes_edited(recipe_ids)
+
+        return list(
+            Recipe.objects
+            .filter(id__in=recipe_ids)
+            .prefetch_related(prefetch_ingredients())
+            .order_by('id')
+        )
+
+    @property
+    def data(self):
+        with serialization():
+            return super().data
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -21,19 +148,89 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'name', 'description', 'ingredients')
         read_only_fields = ('id',)
+        list_serializer_class = RecipeListSerializer
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
+        recipe = Recipe.objects.create(
+            ingredient_names=_names(ingredients), **validated_data)
         _create_ingredients(recipe, ingredients)
+        recipes_edited([recipe.id])
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients', None)
-        super().update(instance, validated_data)
         if ingredients:
-            instance.ingredients.all().delete()
-            _create_ingredients(instance, ingredients)
+            instance.ingredient_names = _names(ingredients)
+        super().update(instance, validated_data)
+        if ingredients and _replace_ingredients(instance, ingredients):
+            recipes_edited([instance.id])
 
         return instance
+
+    @property
+    def data(self):
+        with serialization():
+            return super().data
+
+
+RECIPE_FIELDS = RecipeSerializer.Meta.fields
+
+# Column read by serialize_recipes for each field of RECIPE_FIELDS.
+FIELD_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'ingredients': 'ingredient_names',
+}
+
+RECIPE_COLUMNS = tuple(FIELD_COLUMNS[field] for field in RECIPE_FIELDS)
+
+
+def recipe_columns(fields) -> tuple:
+    """Columns to select to serialize ``fields`` of recipes."""
+    return tuple(FIELD_COLUMNS[field] for field in fields)
+
+
+def _ingredients(row) -> list:
+    return [{'name': name} for name in row['ingredient_names']]
+
+
+_FIELD_VALUES = {
+    'id': itemgetter('id'),
+    'name': itemgetter('name'),
+    'description': itemgetter('description'),
+    'ingredients': _ingredients,
+}
+
+
+def serialize_recipes(rows, fields=RECIPE_FIELDS) -> list:
+    """Read-only fast path producing the same output as RecipeSerializer.
+
+    Takes ``values(*RECIPE_COLUMNS)`` rows and builds the ingredients from
+    the denormalized `ingredient_names` column, so no other table is read
+    and the per-field machinery of ModelSerializer is skipped. With a
+    subset of ``fields``, rows only need their `recipe_columns`.
+    """
+    with serialization():
+        return _serialize_recipes(rows, fields)
+
+
+def _serialize_recipes(rows, fields) -> list:
+    if fields != RECIPE_FIELDS:
+        values = [(field, _FIELD_VALUES[field]) for field in fields]
+        return [{field: value(row) for field, value in values}
+                for row in rows]
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'ingredients': _ingredients(row),
+        }
+        for row in rows
+    ]
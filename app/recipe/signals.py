@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, RecipeIngredient
+from core.signals import recipes_changed
+from recipe import autocomplete
+from recipe.cache import invalidate_recipes
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_written(instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    autocomplete.recipe_saved(instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    autocomplete.recipe_deleted(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        recipe_ids = list(
+            instance.recipe_ingredients.values_list('recipe_id', flat=True)
+            .distinct())
+        Recipe.objects.sync_ingredient_names(recipe_ids)
+        invalidate_recipes(recipe_ids)
+
+
+@receiver(recipes_changed)
+def recipes_bulk_written(recipe_ids, **kwargs):
+    invalidate_recipes(recipe_ids)
+    autocomplete.recipes_written(recipe_ids)
@@ -0,0 +1,361 @@
+import multiprocessing
+import time
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeSimilarity,
+    RecipeSimilarityRefresh,
+)
+
+# Rows written per INSERT when storing neighbours.
+INSERT_BATCH = 5000
+
+
+def _ranges(starts, lengths):
+    """Concatenation of ``arange(start, start + length)`` for each pair."""
+    offsets = starts - np.cumsum(lengths) + lengths
+    return np.repeat(offsets, lengths) + np.arange(lengths.sum())
+
+
+def load_links(queryset=None):
+    """``(recipe_id, ingredient_id)`` links as an ``(n, 2)`` array."""
+    if queryset is None:
+        queryset = RecipeIngredient.objects.all()
+    rows = queryset.values_list('recipe_id', 'ingredient_id') \
+        .iterator(chunk_size=10000)
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64) \
+        .reshape(-1, 2)
+
+
+class IngredientMatrix:
+    """Sparse recipe × ingredient matrix, stored both ways.
+
+    Each row holds the ingredients of a recipe and each column the recipes
+    using an ingredient, like CSR and CSC arrays. The ingredient overlap
+    of some rows with every other recipe is their product with the
+    transposed matrix, computed by expanding each of their ingredients
+    into its column and counting the (row, recipe) pairs.
+
+    ``sizes`` maps recipe ids to their number of ingredients when the links
+    only cover part of them, as when the matrix is built from the columns
+    of a few recipes.
+    """
+
+    def __init__(self, links, sizes: dict = None):
+        self.recipe_ids, rows = np.unique(links[:, 0], return_inverse=True)
+        ingredient_ids, columns = np.unique(links[:, 1], return_inverse=True)
+        width = max(len(ingredient_ids), 1)
+        # A recipe may list an ingredient twice, it counts once.
+        rows, columns = np.divmod(
+            np.unique(rows.astype(np.int64) * width + columns), width)
+
+        height = len(self.recipe_ids)
+        self._row_ptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(rows, minlength=height))))
+        self._row_columns = columns
+        self._column_ptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(columns, minlength=width))))
+        self._column_rows = rows[np.argsort(columns, kind='stable')]
+
+        if sizes is None:
+            self.sizes = np.diff(self._row_ptr)
+        else:
+            self.sizes = np.array(
+                [sizes[recipe_id] for recipe_id in self.recipe_ids.tolist()],
+                dtype=np.int64)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def rows(self, recipe_ids):
+        """Rows of the recipes of ``recipe_ids`` that have ingredients."""
+        return np.flatnonzero(np.isin(self.recipe_ids, list(recipe_ids)))
+
+    def chunks(self, max_pairs: int):
+        """Split the rows into ``(start, stop)`` ranges whose overlaps
+        expand to at most ``max_pairs`` pairs, or a single row."""
+        column_lengths = np.diff(self._column_ptr)[self._row_columns]
+        pairs = np.concatenate(([0], np.cumsum(column_lengths)))
+        pairs = pairs[self._row_ptr]
+        start = 0
+        while start < len(self):
+            stop = np.searchsorted(pairs, pairs[start] + max_pairs,
+                                   side='right') - 1
+            stop = max(int(stop), start + 1)
+            yield start, stop
+            start = stop
+
+    def similarities(self, rows) -> tuple:
+        """Jaccard similarity of the recipes of ``rows`` with every other
+        recipe sharing an ingredient.
+
+        Returns ``(recipe_ids, similar_ids, scores)`` arrays ordered by
+        recipe, then by decreasing score and by similar recipe id.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self._row_ptr[rows]
+        lengths = self._row_ptr[rows + 1] - starts
+        link_rows = np.repeat(np.arange(len(rows)), lengths)
+        columns = self._row_columns[_ranges(starts, lengths)]
+
+        starts = self._column_ptr[columns]
+        lengths = self._column_ptr[columns + 1] - starts
+        pair_rows = np.repeat(link_rows, lengths)
+        others = self._column_rows[_ranges(starts, lengths)]
+
+        keys, shared = np.unique(pair_rows * len(self) + others,
+                                 return_counts=True)
+        positions, others = np.divmod(keys, len(self))
+        pair_rows = rows[positions]
+        distinct = pair_rows != others
+        pair_rows = pair_rows[distinct]
+        others = others[distinct]
+        shared = shared[distinct]
+
+        scores = shared / (
+            self.sizes[pair_rows] + self.sizes[others] - shared)
+        ids = self.recipe_ids
+        order = np.lexsort((ids[others], -scores, ids[pair_rows]))
+        return ids[pair_rows[order]], ids[others[order]], scores[order]
+
+    def neighbours(self, rows, count: int) -> tuple:
+        """The ``count`` most similar recipes of each of ``rows``, in the
+        format of `similarities`."""
+        return top(*self.similarities(rows), count)
+
+
+def top(recipe_ids, similar_ids, scores, count: int) -> tuple:
+    """Keep the first ``count`` similar recipes of each recipe from arrays
+    ordered by recipe."""
+    rank = np.arange(len(recipe_ids)) - np.searchsorted(recipe_ids,
+                                                        recipe_ids)
+    kept = rank < count
+    return recipe_ids[kept], similar_ids[kept], scores[kept]
+
+
+_worker_matrix = None
+_worker_count = None
+
+
+def _init_worker(matrix: IngredientMatrix, count: int):
+    global _worker_matrix, _worker_count
+    _worker_matrix = matrix
+    _worker_count = count
+
+
+def _chunk_neighbours(matrix: IngredientMatrix, count: int, chunk: tuple):
+    start, stop = chunk
+    return (matrix.recipe_ids[start:stop],
+            *matrix.neighbours(np.arange(start, stop), count))
+
+
+def _worker_neighbours(chunk: tuple):
+    return _chunk_neighbours(_worker_matrix, _worker_count, chunk)
+
+
+def compute_neighbours(matrix: IngredientMatrix, count: int,
+                       max_pairs: int, processes: int = 1):
+    """Yield the neighbours of every recipe of ``matrix``, chunk by chunk.
+
+    Each chunk is ``(chunk_recipe_ids, recipe_ids, similar_ids, scores)``.
+    With several ``processes``, chunks are computed by a pool of workers
+    that each get a copy of the matrix.
+    """
+    chunks = matrix.chunks(max_pairs)
+    if processes <= 1:
+        for chunk in chunks:
+            yield _chunk_neighbours(matrix, count, chunk)
+        return
+
+    with multiprocessing.Pool(processes, _init_worker,
+                              (matrix, count)) as pool:
+        yield from pool.imap(_worker_neighbours, chunks)
+
+
+def _rows(neighbours):
+    return (
+        RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id,
+                         score=score)
+        for recipe_id, similar_id, score in neighbours
+    )
+
+
+def store_neighbours(chunk_recipe_ids, recipe_ids, similar_ids, scores):
+    """Replace the stored neighbours of the recipes of ``chunk_recipe_ids``.
+
+    Recipes deleted since the matrix was loaded are left out.
+    """
+    chunk_recipe_ids = chunk_recipe_ids.tolist()
+    recipe_ids = recipe_ids.tolist()
+    similar_ids = similar_ids.tolist()
+    with transaction.atomic():
+        existing = set(
+            Recipe.objects
+            .filter(id__in=set(chunk_recipe_ids).union(similar_ids))
+            .values_list('id', flat=True))
+        RecipeSimilarity.objects \
+            .filter(recipe_id__in=chunk_recipe_ids).delete()
+        RecipeSimilarity.objects.bulk_create(
+            (row for row in _rows(
+                zip(recipe_ids, similar_ids, scores.tolist()))
+             if row.recipe_id in existing and row.similar_id in existing),
+            batch_size=INSERT_BATCH,
+        )
+
+
+def common_ingredients(ingredient_ids, max_recipes: int) -> set:
+    """Ids among ``ingredient_ids`` of the ingredients used by more than
+    ``max_recipes`` recipes.
+
+    Each ingredient is checked with an OFFSET ``max_recipes`` LIMIT 1 probe
+    of the (ingredient, recipe) index, so a staple costs at most
+    ``max_recipes`` index entries rather than all of its links.
+    """
+    used_more = Exists(
+        RecipeIngredient.objects
+        .filter(ingredient=OuterRef('pk'))[max_recipes:])
+    return set(
+        Ingredient.objects
+        .filter(used_more, id__in=ingredient_ids)
+        .values_list('id', flat=True))
+
+
+def refresh_similar_recipes(recipe_ids, count: int,
+                            max_recipes: int = None):
+    """Recompute the neighbours of recipes whose ingredients changed.
+
+    Only the recipes sharing an ingredient with them are read. Their own
+    neighbours are recomputed exactly. The lists of the recipes they now
+    rank among the most similar, and of the recipes that listed them, are
+    updated with their new scores. Those lists can miss recipes until the
+    next `compute_similar_recipes` run: one that pushed an edited recipe
+    out leaves a slot free, and a recipe the edited one does not rank
+    among its own most similar is not checked for entering it.
+
+    With ``max_recipes``, ingredients used by more recipes than that (salt,
+    olive oil...) do not bring in candidates on their own: candidates are
+    the recipes sharing another ingredient with the edited ones, plus the
+    stored neighbours of the edited recipes and the recipes listing them.
+    Candidates are still compared on all their ingredients.
+    """
+    edited = set(recipe_ids)
+    ingredient_ids = set(
+        RecipeIngredient.objects.filter(recipe_id__in=edited)
+        .values_list('ingredient_id', flat=True))
+    shared = RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+    if max_recipes:
+        rare = ingredient_ids - common_ingredients(ingredient_ids,
+                                                   max_recipes)
+        candidates = set(
+            RecipeIngredient.objects.filter(ingredient_id__in=rare)
+            .values_list('recipe_id', flat=True))
+        for recipe_id, similar_id in RecipeSimilarity.objects.filter(
+                Q(recipe_id__in=edited) | Q(similar_id__in=edited)) \
+                .values_list('recipe_id', 'similar_id'):
+            candidates.update((recipe_id, similar_id))
+        shared = shared.filter(recipe_id__in=candidates | edited)
+    sizes = dict(
+        RecipeIngredient.objects
+        .filter(recipe_id__in=shared.values('recipe_id'))
+        .values('recipe_id')
+        .annotate(size=Count('ingredient_id', distinct=True))
+        .values_list('recipe_id', 'size'))
+    matrix = IngredientMatrix(load_links(shared), sizes)
+    similarities = matrix.similarities(matrix.rows(edited))
+    neighbours = top(*similarities, count)
+
+    others = set(RecipeSimilarity.objects.filter(similar_id__in=edited)
+                 .values_list('recipe_id', flat=True))
+    others.update(neighbours[1].tolist())
+    others.difference_update(edited)
+
+    lists = defaultdict(dict)
+    stored = RecipeSimilarity.objects.filter(recipe_id__in=others) \
+        .values_list('recipe_id', 'similar_id', 'score')
+    for recipe_id, similar_id, score in stored:
+        if similar_id not in edited:
+            lists[recipe_id][similar_id] = score
+    # Jaccard similarity is symmetric.
+    recipe_ids, similar_ids, scores = similarities
+    mentioned = np.isin(similar_ids, list(others))
+    for edited_id, other_id, score in zip(
+            recipe_ids[mentioned].tolist(), similar_ids[mentioned].tolist(),
+            scores[mentioned].tolist()):
+        lists[other_id][edited_id] = score
+
+    updated = [
+        (recipe_id, similar_id, score)
+        for recipe_id in others
+        for similar_id, score in sorted(
+            lists[recipe_id].items(),
+            key=lambda item: (-item[1], item[0]))[:count]
+    ]
+    with transaction.atomic():
+        RecipeSimilarity.objects \
+            .filter(recipe_id__in=edited | others).delete()
+        RecipeSimilarity.objects.bulk_create(
+            chain(_rows(zip(*(array.tolist() for array in neighbours))),
+                  _rows(updated)),
+            batch_size=INSERT_BATCH,
+        )
+
+
+def recipes_edited(recipe_ids):
+    """Queue the recipes whose ingredients were written for
+    `refresh_queued`, in the transaction of the write."""
+    RecipeSimilarityRefresh.objects.bulk_create(
+        RecipeSimilarityRefresh(recipe_id=recipe_id)
+        for recipe_id in recipe_ids)
+
+
+def refresh_queued(batch_size: int, count: int,
+                   max_recipes: int = None) -> int:
+    """Refresh the similar recipes of up to ``batch_size`` of the oldest
+    queued recipes at once and return how many queue rows were done.
+
+    Recipes sharing ingredients with the batch are read once for all of
+    it. The rows are locked with SKIP LOCKED and deleted in the same
+    transaction, so a worker that dies leaves them queued.
+    ``max_recipes`` is passed on to `refresh_similar_recipes`.
+    """
+    with transaction.atomic():
+        queued = list(
+            RecipeSimilarityRefresh.objects
+            .order_by('id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', 'recipe_id')[:batch_size])
+        if not queued:
+            return 0
+
+        refresh_similar_recipes({recipe_id for _, recipe_id in queued},
+                                count, max_recipes)
+        RecipeSimilarityRefresh.objects \
+            .filter(id__in=[row_id for row_id, _ in queued]).delete()
+    return len(queued)
+
+
+def drain(batch_size: int, count: int, poll_interval: float,
+          once: bool = False, max_recipes: int = None) -> int:
+    """Refresh queued recipes batch after batch, waiting
+    ``poll_interval`` seconds whenever the queue is empty.
+
+    With ``once``, return the number of queue rows done as soon as the
+    queue is empty.
+    """
+    refreshed = 0
+    while True:
+        done = refresh_queued(batch_size, count, max_recipes)
+        refreshed += done
+        if done:
+            continue
+        if once:
+            return refreshed
+        time.sleep(poll_interval)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.db import connections
+from django.test import (
+    AsyncRequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from core.asgi import StreamingASGIHandler
+from core.models import Recipe
+from recipe import async_views
+from recipe.async_views import async_view
+from recipe.views import RecipeViewSet
+
+
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self) -> None:
+        self.factory = AsyncRequestFactory()
+        self.recipe = Recipe.objects.create(
+            name='Pizza', description='Sour dough',
+            ingredient_names=['dough'])
+        # Pool threads keep their connections open, which would keep the
+        # test database from being dropped.
+        executor = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='recipe-async')
+        patcher = patch.object(async_views, '_executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(
+            lambda: executor.submit(connections.close_all).result())
+
+    def test_wrapper_is_async(self):
+        view = async_view(csrf_exempt(lambda request: None))
+
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertTrue(view.csrf_exempt)
+
+    async def test_runs_in_pool_thread(self):
+        threads = []
+
+        def view(request):
+            threads.append(threading.current_thread())
+
+        await async_view(view)(self.factory.get('/'))
+
+        self.assertNotEqual(threads, [threading.current_thread()])
+        self.assertTrue(threads[0].name.startswith('recipe-async'))
+
+    async def test_list(self):
+        view = async_view(RecipeViewSet.as_view({'get': 'list'}))
+
+        response = await view(self.factory.get('/api/recipes/'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'id': self.recipe.id,
+            'name': 'Pizza',
+            'description': 'Sour dough',
+            'ingredients': [{'name': 'dough'}],
+        }])
+        self.assertTrue(response.is_rendered)
+
+    async def test_detail(self):
+        view = async_view(RecipeViewSet.as_view({'get': 'retrieve'}))
+
+        found = await view(self.factory.get('/'), pk=str(self.recipe.id))
+        missing = await view(self.factory.get('/'), pk='0')
+
+        self.assertEqual(found.data['name'], 'Pizza')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StreamingASGIHandlerTests(TransactionTestCase):
+    def setUp(self):
+        Recipe.objects.bulk_create(
+            Recipe(name=f'Pizza {i}', description='Bake',
+                   ingredient_names=['dough'])
+            for i in range(5))
+        # The request thread is not ours to clean up: close its connection
+        # when the request finishes instead of keeping it.
+        patcher = patch.dict(connections.settings['default'],
+                             CONN_MAX_AGE=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _get(self, path: str, query_string: bytes = b'') -> list:
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await StreamingASGIHandler()({
+            'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': query_string,
+            'headers': [(b'host', b'testserver')],
+        }, receive, send)
+        return messages
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    async def test_streams_export_from_the_database(self):
+        messages = await self._get(reverse('recipe:recipe-export'))
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        body = b''.join(message.get('body', b'')
+                        for message in messages[1:])
+        self.assertEqual(
+            [json.loads(line)['name'] for line in body.splitlines()],
+            [f'Pizza {i}' for i in reversed(range(5))])
+        # One message per chunk of 2 recipes, then the closing one.
+        self.assertEqual(len(messages), 5)
+        self.assertNotIn('more_body', messages[-1])
+
+    async def test_other_responses(self):
+        messages = await self._get(reverse('recipe:recipe-list'),
+                                   b'page_size=1')
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(messages[1]['body'])['results']), 1)
@@ -0,0 +1,213 @@
+import json
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import autocomplete
+from recipe.autocomplete import PrefixIndex
+
+AUTOCOMPLETE_URL = reverse('recipe:recipe-autocomplete')
+RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def url_for_recipe(recipe_id: int):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def names(results: list) -> list:
+    return [result['name'] for result in results]
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            (1, 'Pizza bianca'), (2, 'Paella'), (3, 'pizza'),
+            (4, 'Pie'), (5, 'Pizza'),
+        ])
+
+    def test_search_by_prefix_ignoring_case(self):
+        self.assertEqual(self.index.search('PIZ', 10), [
+            {'id': 3, 'name': 'pizza'},
+            {'id': 5, 'name': 'Pizza'},
+            {'id': 1, 'name': 'Pizza bianca'},
+        ])
+
+    def test_limit(self):
+        self.assertEqual(names(self.index.search('p', 2)), ['Paella', 'Pie'])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('q', 10), [])
+        self.assertEqual(self.index.search('pizzas', 10), [])
+
+    def test_upsert(self):
+        self.index.upsert(6, 'Pissaladière')
+        self.index.upsert(2, 'Pizza paella')
+
+        self.assertEqual(names(self.index.search('pi', 10)), [
+            'Pie', 'Pissaladière', 'pizza', 'Pizza', 'Pizza bianca',
+            'Pizza paella'])
+        self.assertEqual(self.index.search('pa', 10), [])
+        self.assertEqual(len(self.index), 6)
+
+    def test_remove(self):
+        self.index.remove(3)
+        self.index.remove(42)
+
+        self.assertEqual(names(self.index.search('pizza', 10)),
+                         ['Pizza', 'Pizza bianca'])
+        self.assertEqual(len(self.index), 4)
+
+    def test_update_batch(self):
+        self.index.update(upserts=[(6, 'Pita'), (1, 'Paella negra')],
+                          removals=[3, 42])
+
+        self.assertEqual(names(self.index.search('p', 10)), [
+            'Paella', 'Paella negra', 'Pie', 'Pita', 'Pizza'])
+        self.assertEqual(len(self.index), 5)
+
+    def test_compact(self):
+        self.index.upsert(6, 'Pita')
+        self.index.upsert(1, 'Paella negra')
+        self.index.remove(3)
+        before = self.index.search('p', 10)
+
+        self.index.compact()
+
+        self.assertEqual(self.index.search('p', 10), before)
+        self.assertEqual(len(self.index), 5)
+
+    def test_compacts_once_changes_outgrow_the_run(self):
+        index = PrefixIndex([(1, 'Pizza')], compact_min=2)
+        index.update(upserts=[(2, 'Pie'), (3, 'Pita'), (1, 'Paella')])
+        for thread in threading.enumerate():
+            if thread.name == 'autocomplete-compact':
+                thread.join()
+
+        run, recent, _, hidden = index._state
+        self.assertEqual(len(run), 3)
+        self.assertEqual((recent, hidden), ([], frozenset()))
+        self.assertEqual(names(index.search('p', 10)),
+                         ['Paella', 'Pie', 'Pita'])
+
+
+@override_settings(RECIPE_AUTOCOMPLETE_REFRESH=3600)
+class AutocompleteApiTests(DjangoTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        autocomplete.reset_index()
+        self.addCleanup(autocomplete.reset_index)
+        self.pizza = Recipe.objects.create(name='Pizza', description='Bake')
+        Recipe.objects.create(name='Paella', description='Rice')
+
+    def _complete(self, q: str, **params):
+        return self.client.get(AUTOCOMPLETE_URL, {'q': q, **params})
+
+    def test_returns_id_and_name(self):
+        res = self._complete('pi')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': self.pizza.id, 'name': 'Pizza'}])
+
+    def test_served_from_memory(self):
+        self._complete('p')
+
+        with self.assertNumQueries(0):
+            res = self._complete('pa')
+
+        self.assertEqual(names(res.data['results']), ['Paella'])
+
+    def test_writes_update_index(self):
+        self._complete('p')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post(
+                RECIPE_URL, json.dumps({
+                    'name': 'Pie', 'description': 'Bake',
+                    'ingredients': [{'name': 'apple'}]}),
+                content_type='application/json')
+            self.client.patch(url_for_recipe(self.pizza.id),
+                              json.dumps({'name': 'Calzone'}),
+                              content_type='application/json')
+            self.client.post(
+                RECIPE_BULK_URL, json.dumps([{
+                    'name': 'Pumpkin soup', 'description': 'Boil',
+                    'ingredients': [{'name': 'pumpkin'}]}]),
+                content_type='application/json')
+            self.client.delete(url_for_recipe(created.data['id']))
+
+        with self.assertNumQueries(0):
+            p = self._complete('p')
+            c = self._complete('c')
+
+        self.assertEqual(names(p.data['results']), ['Paella', 'Pumpkin soup'])
+        self.assertEqual(names(c.data['results']), ['Calzone'])
+
+    def test_limit(self):
+        res = self._complete('p', limit=1)
+
+        self.assertEqual(names(res.data['results']), ['Paella'])
+
+    def test_invalid_limit(self):
+        for limit in ('0', '51', 'ten', '²'):
+            res = self._complete('p', limit=limit)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_prefix(self):
+        with self.assertNumQueries(0):
+            res = self._complete(' ')
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_names_sorted_apart_from_lower_case(self):
+        for name in ('Strasse b', 'Straße', 'STRASSE A', 'Stracciatella'):
+            Recipe.objects.create(name=name, description='Mix')
+
+        res = self._complete('stras')
+
+        self.assertEqual(names(res.data['results']),
+                         ['Straße', 'STRASSE A', 'Strasse b'])
+
+    @override_settings(RECIPE_AUTOCOMPLETE_REFRESH=0.01)
+    def test_catches_up_in_the_background(self):
+        threads = []
+        caught_up = threading.Event()
+
+        def catch_up(index):
+            threads.append(threading.current_thread().name)
+            caught_up.set()
+
+        with patch.object(autocomplete.RecipeNameIndex, 'catch_up',
+                          catch_up):
+            self._complete('p')
+            self.assertTrue(caught_up.wait(5))
+            # Stopped before the real catch up could use the database.
+            autocomplete.reset_index()
+            for thread in threading.enumerate():
+                if thread.name == 'autocomplete-catch-up':
+                    thread.join()
+
+        self.assertEqual(threads[0], 'autocomplete-catch-up')
+
+    @override_settings(RECIPE_CHANGES_DELAY=0)
+    def test_catches_up_with_other_processes(self):
+        self._complete('p')
+        # Written without signals, as by another process.
+        Recipe.objects.bulk_create(
+            [Recipe(name='Pancakes', description='Fry')])
+        Recipe.objects.filter(name='Paella').delete()
+
+        with self.assertNumQueries(0):
+            self._complete('p')
+        autocomplete.get_index().catch_up()
+        res = self._complete('p')
+
+        self.assertEqual(names(res.data['results']), ['Pancakes', 'Pizza'])
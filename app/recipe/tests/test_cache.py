@@ -0,0 +1,224 @@
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeIngredient
+from recipe.cache import LRUCache
+
+RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+
+LRU_CACHE = {'BACKEND': 'recipe.cache.LRUCache'}
+SHARED_CACHE = {'BACKEND': 'recipe.cache.SharedCache'}
+
+
+def url_for_recipe(recipe_id: int):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class LRUCacheTests(TestCase):
+    def test_get_missing_key(self):
+        self.assertIsNone(LRUCache().get('missing'))
+
+    def test_set_and_get(self):
+        cache = LRUCache()
+        cache.set('pizza', 1)
+
+        self.assertEqual(cache.get('pizza'), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('pizza', 1)
+        cache.set('paella', 2)
+        cache.get('pizza')
+        cache.set('calzone', 3)
+
+        self.assertEqual(cache.get('pizza'), 1)
+        self.assertIsNone(cache.get('paella'))
+        self.assertEqual(cache.get('calzone'), 3)
+
+    @patch('recipe.cache.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        cache = LRUCache(timeout=10)
+        monotonic.return_value = 100
+        cache.set('pizza', 1)
+
+        monotonic.return_value = 105
+        self.assertEqual(cache.get('pizza'), 1)
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get('pizza'))
+
+
+@override_settings(RECIPE_CACHE=LRU_CACHE)
+class RecipeCacheTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.recipe = Recipe.objects.create(name='Pizza',
+                                            description='Sour dough')
+        self._add_ingredient('tomato')
+
+    def _add_ingredient(self, name: str):
+        ingredient, _ = Ingredient.objects.get_or_create(name=name)
+        self.recipe.ingredient_names.append(name)
+        self.recipe.save(update_fields=['ingredient_names'])
+        RecipeIngredient.objects.create(recipe=self.recipe,
+                                        ingredient=ingredient)
+
+    def test_detail_is_served_from_cache(self):
+        first = self.client.get(url_for_recipe(self.recipe.id))
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url_for_recipe(self.recipe.id))
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
+    def test_list_is_served_from_cache(self):
+        first = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(first.data, second.data)
+
+    def test_missing_recipe_is_not_cached(self):
+        self.client.get(url_for_recipe(self.recipe.id + 1))
+        recipe = Recipe.objects.create(id=self.recipe.id + 1, name='Paella',
+                                       description='Rice')
+
+        res = self.client.get(url_for_recipe(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_invalidates_detail_and_list(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+        self.client.get(RECIPE_URL)
+
+        self.client.patch(url_for_recipe(self.recipe.id),
+                          json.dumps({'name': 'Calzone'}),
+                          content_type='application/json')
+
+        detail = self.client.get(url_for_recipe(self.recipe.id))
+        self.assertEqual(detail.data['name'], 'Calzone')
+        listed = self.client.get(RECIPE_URL)
+        self.assertEqual(listed.data['results'][0]['name'], 'Calzone')
+
+    def test_other_recipes_stay_cached(self):
+        other = Recipe.objects.create(name='Paella', description='Rice')
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        other.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(url_for_recipe(self.recipe.id))
+
+    def test_ingredient_write_invalidates_recipe(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        self._add_ingredient('basil')
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+        self.assertEqual(len(res.data['ingredients']), 2)
+
+    def test_catalogue_rename_invalidates_recipes(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        Ingredient.objects.filter(name='tomato').update(name='x')
+        ingredient = Ingredient.objects.get(name='x')
+        ingredient.name = 'Tomato'
+        ingredient.save()
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+        self.assertEqual(res.data['ingredients'], [{'name': 'Tomato'}])
+
+    def test_delete_invalidates_detail(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        self.client.delete(url_for_recipe(self.recipe.id))
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_create_invalidates_list(self):
+        self.client.get(RECIPE_URL)
+        payload = [{'name': 'Paella', 'description': 'Rice',
+                    'ingredients': [{'name': 'rice'}]}]
+
+        self.client.post(RECIPE_BULK_URL, json.dumps(payload),
+                         content_type='application/json')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_bulk_delete_invalidates_detail(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        self.client.delete(f'{RECIPE_BULK_URL}?ids={self.recipe.id}')
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_response_has_etag(self):
+        res = self.client.get(url_for_recipe(self.recipe.id))
+
+        self.assertTrue(res['ETag'].startswith('"'))
+
+    def test_conditional_get_not_modified(self):
+        etag = self.client.get(url_for_recipe(self.recipe.id))['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url_for_recipe(self.recipe.id),
+                                  HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_conditional_get_after_change(self):
+        etag = self.client.get(url_for_recipe(self.recipe.id))['ETag']
+        self.recipe.name = 'Calzone'
+        self.recipe.save()
+
+        res = self.client.get(url_for_recipe(self.recipe.id),
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_conditional_get_on_cache_miss(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        with override_settings(RECIPE_CACHE=LRU_CACHE):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(RECIPE_CACHE=SHARED_CACHE)
+class SharedRecipeCacheTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.recipe = Recipe.objects.create(name='Pizza',
+                                            description='Sour dough')
+
+    def test_detail_is_served_from_cache(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url_for_recipe(self.recipe.id))
+
+        self.assertEqual(res.data['name'], 'Pizza')
+
+    def test_update_invalidates_detail(self):
+        self.client.get(url_for_recipe(self.recipe.id))
+        self.recipe.name = 'Calzone'
+        self.recipe.save()
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+
+        self.assertEqual(res.data['name'], 'Calzone')
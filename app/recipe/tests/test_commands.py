@@ -0,0 +1,54 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Recipe
+
+
+class BenchmarkApiCommandTest(TestCase):
+    def test_reports_every_scenario(self):
+        out = StringIO()
+
+        call_command('benchmark_api', '--recipes', '30', '--requests', '5',
+                     '--warmup', '1', '--label', 'abc123', stdout=out,
+                     stderr=StringIO())
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [result['scenario'] for result in results],
+            ['list', 'detail', 'search', 'autocomplete', 'create', 'update',
+             'delete'])
+        for result in results:
+            self.assertEqual(result['count'], 5)
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['label'], 'abc123')
+            if result['scenario'] != 'autocomplete':
+                # Autocomplete is served from memory once the index is built.
+                self.assertGreater(result['queries_per_request'], 0)
+            self.assertIn('p99_ms', result)
+            self.assertIn('requests_per_s', result)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_unknown_scenario(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown scenarios'):
+            call_command('benchmark_api', '--scenarios', 'list,upsert')
+
+
+class BenchmarkCountCommandTest(TestCase):
+    def test_reports_every_filter_and_mode(self):
+        out = StringIO()
+
+        call_command('benchmark_count', '--sizes', '50', '--queries', '2',
+                     stdout=out)
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(result['filter'], result['mode']) for result in results],
+            [(name, mode) for name in ('none', 'selective', 'broad')
+             for mode in ('page', 'exact', 'estimated')])
+        self.assertEqual(results[1]['mean_count'], 50)
+        self.assertIn('mean_relative_error', results[2])
+        self.assertEqual(Recipe.objects.count(), 0)
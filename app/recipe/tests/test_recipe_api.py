@@ -1,14 +1,26 @@
 import json
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
 
+from django.db import DatabaseError, connection
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Ingredient
-from recipe.serializers import RecipeSerializer
+from core.models import Recipe, Ingredient, RecipeIngredient, RecipeTombstone
+from recipe.serializers import (
+    RECIPE_COLUMNS,
+    RecipeSerializer,
+    serialize_recipes,
+)
 
 RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+RECIPE_CHANGES_URL = reverse('recipe:recipe-changes')
 
 
 def sample_recipe(name: str = "Pizza",
@@ -16,8 +28,14 @@ def sample_recipe(name: str = "Pizza",
     return Recipe.objects.create(name=name, description=description)
 
 
-def sample_ingredient(recipe: Recipe, name: str = "Cucumber") -> Ingredient:
-    return Ingredient.objects.create(name=name, recipe=recipe)
+def sample_ingredient(recipe: Recipe,
+                      name: str = "Cucumber") -> RecipeIngredient:
+    ingredient, _ = Ingredient.objects.get_or_create(name=name)
+    recipe.ingredient_names.append(name)
+    recipe.save(update_fields=['ingredient_names'])
+    return RecipeIngredient.objects.create(
+        recipe=recipe, ingredient=ingredient,
+        position=len(recipe.ingredient_names) - 1)
 
 
 def url_for_recipe(recipe_id: str):
@@ -40,7 +58,7 @@ class RecipeTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(serializer.data, res.data)
+        self.assertEqual(serializer.data, res.data['results'])
 
     def test_retrieve_specific_recipe(self):
         recipe = sample_recipe()
@@ -55,6 +73,10 @@ class RecipeTests(TestCase):
         res = self.client.get(url_for_recipe(123))
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_retrieve_recipe_with_non_ascii_digit_id(self):
+        res = self.client.get(url_for_recipe('\u00b2'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_retrieve_recipes_by_name_substring(self):
         recipe1 = sample_recipe()
         sample_ingredient(recipe1)
@@ -65,10 +87,25 @@ class RecipeTests(TestCase):
 
         res = self.client.get(RECIPE_URL, {'name': 'Durum'})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
 
         serializer = RecipeSerializer(recipe3)
-        self.assertIn(serializer.data, res.data)
+        self.assertIn(serializer.data, res.data['results'])
+
+    def test_retrieve_recipes_by_name_substring_ignoring_case(self):
+        recipe1 = sample_recipe(name='Shawarma')
+        sample_ingredient(recipe1)
+        recipe2 = sample_recipe(name='Chicken SHAWARMA')
+        sample_ingredient(recipe2)
+        recipe3 = sample_recipe(name='Falafel')
+        sample_ingredient(recipe3)
+
+        res = self.client.get(RECIPE_URL, {'iname': 'shawarma'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+        self.assertIn(RecipeSerializer(recipe1).data, res.data['results'])
+        self.assertIn(RecipeSerializer(recipe2).data, res.data['results'])
 
     def test_create_recipe(self):
         payload = {
@@ -299,9 +336,810 @@ class RecipeTests(TestCase):
         sample_ingredient(recipe, 'lettuce')
 
         recipes_before = Recipe.objects.count()
-        ingredients_before = Ingredient.objects.count()
+        ingredients_before = RecipeIngredient.objects.count()
         ingredients_now = ingredients_before - recipe.ingredients.count()
         res = self.client.delete(url_for_recipe(recipe.id))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Ingredient.objects.count(), ingredients_now)
+        self.assertEqual(RecipeIngredient.objects.count(), ingredients_now)
         self.assertEqual(Recipe.objects.all().count(), recipes_before-1)
+
+
+class RecipeQueryCountTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def _create_recipes(self, count: int, name: str = "Pizza"):
+        for _ in range(count):
+            recipe = sample_recipe(name=name)
+            sample_ingredient(recipe)
+            sample_ingredient(recipe, 'tomato')
+
+    def test_list_query_count_is_constant(self):
+        self._create_recipes(2)
+        with self.assertNumQueries(1):
+            self.client.get(RECIPE_URL)
+
+        self._create_recipes(10)
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 12)
+
+    def test_search_query_count_is_constant(self):
+        self._create_recipes(10, name="Durum kebab")
+        self._create_recipes(3)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, {'name': 'Durum'})
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_detail_query_count(self):
+        self._create_recipes(1)
+        recipe = Recipe.objects.latest('id')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url_for_recipe(recipe.id))
+        self.assertEqual(len(res.data['ingredients']), 2)
+
+
+class RecipePaginationTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def _collect_pages(self, params: dict) -> list:
+        ids = []
+        res = self.client.get(RECIPE_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(recipe['id'] for recipe in res.data['results'])
+            if not res.data['next']:
+                return ids
+            res = self.client.get(res.data['next'])
+
+    def test_list_is_paginated_with_cursor(self):
+        recipes = [sample_recipe(name=f"Pizza {i}") for i in range(5)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']],
+                         [recipes[4].id, recipes[3].id])
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_walk_all_pages(self):
+        recipes = [sample_recipe(name=f"Pizza {i}") for i in range(7)]
+
+        ids = self._collect_pages({'page_size': 3})
+
+        self.assertEqual(ids, [r.id for r in reversed(recipes)])
+
+    def test_pagination_with_name_filter(self):
+        durums = [sample_recipe(name=f"Durum {i}") for i in range(5)]
+        for i in range(5):
+            sample_recipe(name=f"Pizza {i}")
+
+        ids = self._collect_pages({'page_size': 2, 'name': 'Durum'})
+
+        self.assertEqual(ids, [r.id for r in reversed(durums)])
+
+    def test_previous_page(self):
+        for i in range(4):
+            sample_recipe(name=f"Pizza {i}")
+
+        first = self.client.get(RECIPE_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        res = self.client.get(second.data['previous'])
+
+        self.assertEqual(res.data['results'], first.data['results'])
+
+    def test_deep_page_query_count(self):
+        for i in range(6):
+            sample_recipe(name=f"Pizza {i}")
+        first = self.client.get(RECIPE_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        with self.assertNumQueries(1):
+            self.client.get(second.data['next'])
+
+    def test_no_count_by_default(self):
+        sample_recipe()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertNotIn('count', res.data)
+
+    def test_exact_count(self):
+        for i in range(5):
+            sample_recipe(name=f"Pizza {i}")
+        sample_recipe(name="Durum")
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2, 'name': 'Pizza',
+                                           'count': 'exact'})
+
+        self.assertEqual(res.data['count'], 5)
+        self.assertTrue(res.data['count_exact'])
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_estimated_count_of_small_results_is_exact(self):
+        for i in range(3):
+            sample_recipe(name=f"Pizza {i}")
+
+        res = self.client.get(RECIPE_URL, {'count': 'estimated'})
+
+        self.assertEqual(res.data['count'], 3)
+        self.assertTrue(res.data['count_exact'])
+
+    @override_settings(RECIPE_EXACT_COUNT_BELOW=0)
+    def test_estimated_count_from_planner(self):
+        for i in range(3):
+            sample_recipe(name=f"Pizza {i}")
+
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPE_URL, {'count': 'estimated'})
+
+        self.assertIsInstance(res.data['count'], int)
+        self.assertFalse(res.data['count_exact'])
+
+    def test_invalid_count_mode(self):
+        res = self.client.get(RECIPE_URL, {'count': 'all'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeWriteTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    @staticmethod
+    def _payload(ingredient_count: int) -> dict:
+        return {
+            'name': 'Pizza',
+            'description': 'Put it in the oven',
+            'ingredients': [{'name': f'ingredient {i}'}
+                            for i in range(ingredient_count)]
+        }
+
+    def _count_queries(self, method, url, payload) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            res = method(url, json.dumps(payload),
+                         content_type="application/json")
+        self.assertLess(res.status_code, 300)
+        return len(queries)
+
+    def test_create_query_count_independent_of_ingredients(self):
+        few = self._count_queries(self.client.post, RECIPE_URL,
+                                  self._payload(2))
+        many = self._count_queries(self.client.post, RECIPE_URL,
+                                   self._payload(40))
+
+        self.assertEqual(few, many)
+        self.assertEqual(RecipeIngredient.objects.count(), 42)
+        self.assertEqual(Ingredient.objects.count(), 40)
+
+    def test_update_query_count_independent_of_ingredients(self):
+        counts = []
+        for ingredient_count in (2, 40):
+            recipe = sample_recipe()
+            sample_ingredient(recipe)
+            counts.append(self._count_queries(self.client.patch,
+                                              url_for_recipe(recipe.id),
+                                              self._payload(ingredient_count)))
+            self.assertEqual(recipe.ingredients.count(), ingredient_count)
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_writes_keep_ingredient_names_in_sync(self):
+        res = self.client.post(RECIPE_URL, json.dumps(self._payload(3)),
+                               content_type="application/json")
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredient_names,
+                         ['ingredient 0', 'ingredient 1', 'ingredient 2'])
+
+        payload = {'ingredients': [{'name': 'ingredient 2'},
+                                   {'name': 'salt'}]}
+        self.client.patch(url_for_recipe(recipe.id), json.dumps(payload),
+                          content_type="application/json")
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_names, ['ingredient 2', 'salt'])
+
+        self.client.post(RECIPE_BULK_URL, json.dumps([self._payload(2)]),
+                         content_type="application/json")
+        self.assertEqual(Recipe.objects.latest('id').ingredient_names,
+                         ['ingredient 0', 'ingredient 1'])
+        self.assertEqual(Recipe.objects.ingredient_names_drift(
+            Recipe.objects.values_list('id', flat=True)), {})
+
+    def test_update_keeps_unchanged_ingredients(self):
+        recipe = sample_recipe()
+        dough = sample_ingredient(recipe, 'dough')
+        cheese = sample_ingredient(recipe, 'cheese')
+        payload = {'ingredients': [{'name': 'dough'}, {'name': 'cheese'},
+                                   {'name': 'basil'}]}
+
+        res = self.client.patch(url_for_recipe(recipe.id),
+                                json.dumps(payload),
+                                content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        stored = dict(recipe.recipe_ingredients
+                      .values_list('ingredient__name', 'id'))
+        self.assertEqual(set(stored), {'dough', 'cheese', 'basil'})
+        self.assertEqual(stored['dough'], dough.id)
+        self.assertEqual(stored['cheese'], cheese.id)
+
+    def test_update_follows_submitted_order(self):
+        recipe = sample_recipe()
+        sample_ingredient(recipe, 'dough')
+        sample_ingredient(recipe, 'cheese')
+        payload = {'ingredients': [{'name': 'basil'}, {'name': 'cheese'},
+                                   {'name': 'dough'}]}
+
+        res = self.client.patch(url_for_recipe(recipe.id),
+                                json.dumps(payload),
+                                content_type="application/json")
+
+        self.assertEqual(res.data['ingredients'], payload['ingredients'])
+        res = self.client.get(url_for_recipe(recipe.id))
+        self.assertEqual(res.data['ingredients'], payload['ingredients'])
+        self.assertEqual(
+            Recipe.objects.ingredient_names_drift([recipe.id]), {})
+
+    def test_update_moves_ingredients_in_place(self):
+        recipe = sample_recipe()
+        dough = sample_ingredient(recipe, 'dough')
+        cheese = sample_ingredient(recipe, 'cheese')
+        payload = {'ingredients': [{'name': 'basil'}, {'name': 'dough'},
+                                   {'name': 'cheese'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(url_for_recipe(recipe.id),
+                              json.dumps(payload),
+                              content_type="application/json")
+
+        writes = [query['sql'] for query in queries
+                  if 'core_recipeingredient' in query['sql']
+                  and not query['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+        self.assertTrue(writes[1].startswith('INSERT'))
+        self.assertEqual(
+            list(recipe.recipe_ingredients.order_by('position')
+                 .values_list('ingredient__name', 'id', 'position'))[1:],
+            [('dough', dough.id, 1), ('cheese', cheese.id, 2)])
+
+    def test_update_only_deletes_removed_ingredients(self):
+        recipe = sample_recipe()
+        dough = sample_ingredient(recipe, 'dough')
+        sample_ingredient(recipe, 'cheese')
+        payload = {'ingredients': [{'name': 'dough'}]}
+
+        res = self.client.patch(url_for_recipe(recipe.id),
+                                json.dumps(payload),
+                                content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(recipe.recipe_ingredients
+                 .values_list('id', 'ingredient__name')),
+            [(dough.id, 'dough')])
+
+    def test_update_with_duplicated_ingredients(self):
+        recipe = sample_recipe()
+        salt = sample_ingredient(recipe, 'salt')
+        sample_ingredient(recipe, 'salt')
+        sample_ingredient(recipe, 'salt')
+        payload = {'ingredients': [{'name': 'salt'}, {'name': 'salt'},
+                                   {'name': 'pepper'}]}
+
+        res = self.client.patch(url_for_recipe(recipe.id),
+                                json.dumps(payload),
+                                content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = sorted(i['name'] for i in res.data['ingredients'])
+        self.assertEqual(names, ['pepper', 'salt', 'salt'])
+        self.assertTrue(
+            recipe.recipe_ingredients.filter(id=salt.id).exists())
+
+    def test_update_without_ingredient_changes_writes_nothing(self):
+        recipe = sample_recipe()
+        sample_ingredient(recipe, 'dough')
+        payload = {'ingredients': [{'name': 'dough'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(url_for_recipe(recipe.id),
+                              json.dumps(payload),
+                              content_type="application/json")
+
+        ingredient_writes = [
+            q['sql'] for q in queries
+            if q['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        self.assertEqual(ingredient_writes, [])
+
+    def test_create_is_atomic(self):
+        serializer = RecipeSerializer(data=self._payload(3))
+        serializer.is_valid(raise_exception=True)
+
+        with patch.object(RecipeIngredient.objects, 'bulk_create',
+                          side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                serializer.save()
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_is_atomic(self):
+        recipe = sample_recipe()
+        sample_ingredient(recipe)
+        serializer = RecipeSerializer(recipe, data=self._payload(3),
+                                      partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        with patch.object(RecipeIngredient.objects, 'bulk_create',
+                          side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                serializer.save()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.description, "Sour dough")
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+
+class RecipeBulkTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    @staticmethod
+    def _recipes_payload(count: int) -> list:
+        return [
+            {
+                'name': f'Pizza {i}',
+                'description': 'Put it in the oven',
+                'ingredients': [{'name': 'dough'}, {'name': f'topping {i}'}]
+            }
+            for i in range(count)
+        ]
+
+    def _bulk_create(self, payload):
+        return self.client.post(RECIPE_BULK_URL, json.dumps(payload),
+                                content_type="application/json")
+
+    def test_bulk_create_recipes(self):
+        payload = self._recipes_payload(3)
+
+        res = self._bulk_create(payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        for sent, created in zip(payload, res.data):
+            self.assertIsNotNone(created['id'])
+            self.assertEqual(sent['name'], created['name'])
+            self.assertEqual(sent['ingredients'], created['ingredients'])
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(RecipeIngredient.objects.count(), 6)
+
+    def test_bulk_create_query_count_independent_of_batch_size(self):
+        counts = []
+        for size in (2, 30):
+            with CaptureQueriesContext(connection) as queries:
+                res = self._bulk_create(self._recipes_payload(size))
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        payload = self._recipes_payload(3)
+        payload[1]['name'] = ''
+        del payload[2]['ingredients']
+
+        res = self._bulk_create(payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('name', res.data[1])
+        self.assertIn('ingredients', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_BULK_MAX_ITEMS=2)
+    def test_bulk_create_batch_limit(self):
+        res = self._bulk_create(self._recipes_payload(3))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_empty_batch(self):
+        res = self._bulk_create([])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_recipes_by_ids(self):
+        recipes = [sample_recipe(name=f'Pizza {i}') for i in range(4)]
+        for recipe in recipes:
+            sample_ingredient(recipe)
+        wanted = [recipes[0].id, recipes[2].id]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL,
+                                  {'ids': ','.join(map(str, wanted))})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']],
+                         sorted(wanted, reverse=True))
+
+    def test_retrieve_recipes_by_invalid_ids(self):
+        res = self.client.get(RECIPE_URL, {'ids': '1,pizza'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_BULK_MAX_ITEMS=2)
+    def test_retrieve_recipes_by_ids_batch_limit(self):
+        res = self.client.get(RECIPE_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete_recipes(self):
+        recipes = [sample_recipe(name=f'Pizza {i}') for i in range(4)]
+        for recipe in recipes:
+            sample_ingredient(recipe)
+        ids = ','.join(str(recipe.id) for recipe in recipes[:3])
+
+        res = self.client.delete(f'{RECIPE_BULK_URL}?ids={ids}')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.all()), [recipes[3]])
+        self.assertEqual(RecipeIngredient.objects.count(), 1)
+
+    def test_bulk_delete_query_count_independent_of_batch_size(self):
+        counts = []
+        for size in (2, 30):
+            recipes = [sample_recipe() for _ in range(size)]
+            for recipe in recipes:
+                sample_ingredient(recipe)
+            ids = ','.join(str(recipe.id) for recipe in recipes)
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.delete(f'{RECIPE_BULK_URL}?ids={ids}')
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_delete_without_ids(self):
+        res = self.client.delete(RECIPE_BULK_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeExportTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def _export(self, params=None) -> list:
+        res = self.client.get(RECIPE_EXPORT_URL, params or {})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        content = b''.join(res.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_matches_serializer(self):
+        recipes = [sample_recipe(name=f'Pizza {i}') for i in range(3)]
+        for recipe in recipes:
+            sample_ingredient(recipe)
+            sample_ingredient(recipe, 'tomato')
+        sample_recipe(name='Empty')
+
+        lines = self._export()
+
+        expected = RecipeSerializer(
+            Recipe.objects.order_by('-id'), many=True).data
+        self.assertEqual(lines, json.loads(json.dumps(expected)))
+
+    def test_export_with_name_filter(self):
+        durum = sample_recipe(name='Durum kebab')
+        sample_recipe(name='Pizza')
+
+        lines = self._export({'name': 'Durum'})
+
+        self.assertEqual([line['id'] for line in lines], [durum.id])
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_recipe_table_only(self):
+        for i in range(5):
+            sample_ingredient(sample_recipe(name=f'Pizza {i}'))
+
+        with CaptureQueriesContext(connection) as queries:
+            lines = self._export()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual([len(line['ingredients']) for line in lines], [1] * 5)
+        self.assertFalse([q for q in queries
+                          if 'core_recipeingredient' in q['sql']
+                          or 'core_ingredient' in q['sql']])
+
+
+class FastSerializationTests(DjangoTestCase):
+    def test_output_is_identical_to_serializer(self):
+        recipe1 = sample_recipe(name='Calçotada', description='Grill "it"')
+        sample_ingredient(recipe1, 'calçots')
+        sample_ingredient(recipe1, 'romesco')
+        recipe2 = sample_recipe(name='Pizza')
+        sample_ingredient(recipe2, 'dough')
+        sample_recipe(name='Empty')
+        recipes = Recipe.objects.order_by('-id')
+
+        current = JSONRenderer().render(
+            RecipeSerializer(recipes, many=True).data)
+        fast = JSONRenderer().render(
+            serialize_recipes(recipes.values(*RECIPE_COLUMNS)))
+
+        self.assertEqual(current, fast)
+
+    def test_ingredients_read_from_recipe_rows(self):
+        for i in range(5):
+            sample_ingredient(sample_recipe(name=f'Pizza {i}'))
+        rows = list(Recipe.objects.values(*RECIPE_COLUMNS))
+
+        with self.assertNumQueries(0):
+            data = serialize_recipes(rows)
+        self.assertEqual(data[0]['ingredients'], [{'name': 'Cucumber'}])
+
+
+class RecipeIngredientSearchTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.caprese = sample_recipe(name='Caprese')
+        for name in ('Tomato', 'basil', 'mozzarella'):
+            sample_ingredient(self.caprese, name)
+        self.pesto = sample_recipe(name='Pesto')
+        for name in ('basil', 'pine nuts', 'garlic'):
+            sample_ingredient(self.pesto, name)
+        self.salad = sample_recipe(name='Salad')
+        for name in ('tomato', 'lettuce'):
+            sample_ingredient(self.salad, name)
+
+    def _search(self, params: dict) -> list:
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_filter_by_ingredient(self):
+        ids = self._search({'ingredients': 'basil'})
+
+        self.assertEqual(ids, [self.pesto.id, self.caprese.id])
+
+    def test_filter_by_all_ingredients(self):
+        ids = self._search({'ingredients': 'tomato,basil'})
+
+        self.assertEqual(ids, [self.caprese.id])
+
+    def test_filter_ignores_case_and_spaces(self):
+        ids = self._search({'ingredients': ' TOMATO , Basil'})
+
+        self.assertEqual(ids, [self.caprese.id])
+
+    def test_filter_with_repeated_ingredient(self):
+        sample_ingredient(self.salad, 'Tomato')
+
+        ids = self._search({'ingredients': 'tomato,lettuce'})
+
+        self.assertEqual(ids, [self.salad.id])
+
+    def test_exclude_ingredients(self):
+        ids = self._search({'exclude_ingredients': 'pine nuts'})
+
+        self.assertEqual(ids, [self.salad.id, self.caprese.id])
+
+    def test_exclude_any_of_ingredients(self):
+        ids = self._search({'exclude_ingredients': 'garlic,lettuce'})
+
+        self.assertEqual(ids, [self.caprese.id])
+
+    def test_include_and_exclude_ingredients(self):
+        ids = self._search({'ingredients': 'basil',
+                            'exclude_ingredients': 'nuts,pine nuts'})
+
+        self.assertEqual(ids, [self.caprese.id])
+
+    def test_combined_with_name_filter(self):
+        ids = self._search({'ingredients': 'tomato', 'name': 'Sal'})
+
+        self.assertEqual(ids, [self.salad.id])
+
+    def test_unknown_ingredient(self):
+        self.assertEqual(self._search({'ingredients': 'tomato,squid'}), [])
+
+    def test_query_count(self):
+        with self.assertNumQueries(1):
+            self.client.get(RECIPE_URL, {'ingredients': 'tomato,basil',
+                                         'exclude_ingredients': 'nuts'})
+
+
+class RecipeSparseFieldsTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.recipe = sample_recipe(name='Pizza', description='Long text')
+        sample_ingredient(self.recipe, 'dough')
+
+    def _get(self, url: str, params: dict):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sql = ' '.join(q['sql'] for q in queries)
+        self.assertNotIn('description', sql)
+        self.assertNotIn('ingredient', sql)
+        return res
+
+    def test_list_selects_requested_columns_only(self):
+        res = self._get(RECIPE_URL, {'fields': 'name,id'})
+
+        self.assertEqual(res.data['results'],
+                         [{'id': self.recipe.id, 'name': 'Pizza'}])
+
+    def test_search_without_id(self):
+        sample_recipe(name='Calzone')
+
+        res = self._get(RECIPE_URL, {'name': 'Piz', 'fields': 'name'})
+
+        self.assertEqual(res.data['results'], [{'name': 'Pizza'}])
+
+    def test_detail(self):
+        res = self._get(url_for_recipe(self.recipe.id), {'fields': 'name'})
+
+        self.assertEqual(res.data, {'name': 'Pizza'})
+
+    def test_ingredients_only(self):
+        res = self.client.get(url_for_recipe(self.recipe.id),
+                              {'fields': 'ingredients'})
+
+        self.assertEqual(res.data, {'ingredients': [{'name': 'dough'}]})
+
+    def test_export(self):
+        res = self.client.get(RECIPE_EXPORT_URL, {'fields': 'id'})
+
+        content = b''.join(res.streaming_content).decode()
+        self.assertEqual(content, f'{{"id":{self.recipe.id}}}\n')
+
+    def test_pagination_without_id(self):
+        sample_recipe(name='Calzone')
+
+        first = self.client.get(RECIPE_URL,
+                                {'fields': 'name', 'page_size': 1})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(first.data['results'], [{'name': 'Calzone'}])
+        self.assertEqual(second.data['results'], [{'name': 'Pizza'}])
+
+    def test_cached_separately_from_full_response(self):
+        url = url_for_recipe(self.recipe.id)
+        self.client.get(url)
+
+        res = self.client.get(url, {'fields': 'id'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id})
+
+    def test_unknown_field(self):
+        res = self.client.get(RECIPE_URL, {'fields': 'name,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(res.data['fields']))
+
+    def test_empty_fields(self):
+        for fields in ('', ',', ' , '):
+            res = self.client.get(RECIPE_URL, {'fields': fields})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('fields', res.data)
+
+
+@override_settings(RECIPE_CHANGES_DELAY=0)
+class RecipeChangesTests(DjangoTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.recipes = [sample_recipe(name=f'Pizza {i}') for i in range(3)]
+        for recipe in self.recipes:
+            sample_ingredient(recipe)
+
+    def _changes(self, since=None, **params) -> dict:
+        if since:
+            params['since'] = since
+        res = self.client.get(RECIPE_CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def _ids(self, data: dict) -> list:
+        return [change['id'] for change in data['results']]
+
+    def _drain(self, since=None) -> str:
+        return self._changes(since, page_size=1000)['cursor']
+
+    def test_full_sync_in_change_order(self):
+        data = self._changes()
+
+        self.assertEqual(self._ids(data), [r.id for r in self.recipes])
+        self.assertFalse(data['has_more'])
+        change = data['results'][0]
+        self.assertFalse(change['deleted'])
+        self.assertEqual(change['recipe'], RecipeSerializer(
+            self.recipes[0]).data)
+
+    def test_paginates_with_cursor(self):
+        first = self._changes(page_size=2)
+        self.assertEqual(self._ids(first), [r.id for r in self.recipes[:2]])
+        self.assertTrue(first['has_more'])
+
+        res = self.client.get(first['next'])
+        self.assertEqual(self._ids(res.data), [self.recipes[2].id])
+        self.assertFalse(res.data['has_more'])
+
+    def test_returns_only_new_changes(self):
+        cursor = self._drain()
+
+        data = self._changes(cursor)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['cursor'], cursor)
+
+        recipe = sample_recipe(name='Calzone')
+        self.assertEqual(self._ids(self._changes(cursor)), [recipe.id])
+
+    def test_ingredient_update_bumps_recipe(self):
+        recipe = self.recipes[0]
+        cursor = self._drain()
+
+        payload = {'ingredients': [{'name': 'basil'}]}
+        self.client.patch(url_for_recipe(recipe.id), json.dumps(payload),
+                          content_type="application/json")
+
+        data = self._changes(cursor)
+        self.assertEqual(self._ids(data), [recipe.id])
+        self.assertEqual(data['results'][0]['recipe']['ingredients'],
+                         [{'name': 'basil'}])
+
+    def test_deletes_leave_tombstones(self):
+        cursor = self._drain()
+
+        self.client.delete(url_for_recipe(self.recipes[0].id))
+        ids = f'{self.recipes[1].id},{self.recipes[2].id}'
+        self.client.delete(f'{RECIPE_BULK_URL}?ids={ids}')
+
+        data = self._changes(cursor)
+        self.assertEqual(sorted(self._ids(data)),
+                         [r.id for r in self.recipes])
+        self.assertTrue(all(change['deleted'] and change['recipe'] is None
+                            for change in data['results']))
+        self.assertEqual(RecipeTombstone.objects.count(), 3)
+
+    @override_settings(RECIPE_CHANGES_DELAY=60)
+    def test_recent_changes_are_held_back(self):
+        self.assertEqual(self._changes()['results'], [])
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'Open transactions are read from pg_stat_activity')
+    def test_changes_after_an_open_write_are_held_back(self):
+        cursor = self._drain()
+        other = connection.copy()
+        self.addCleanup(other.close)
+        with other.cursor() as other_cursor:
+            # A long batch of another session, that has written already.
+            other_cursor.execute('BEGIN')
+            other_cursor.execute('SELECT txid_current()')
+            recipe = sample_recipe(name='Calzone')
+
+            self.assertEqual(self._changes(cursor)['results'], [])
+
+            other_cursor.execute('ROLLBACK')
+        self.assertEqual(self._ids(self._changes(cursor)), [recipe.id])
+
+    def test_invalid_cursor(self):
+        for since in ('nonsense', 'bm9uc2Vuc2U=', 'MjAyMi0wMS0wMSwx'):
+            res = self.client.get(RECIPE_CHANGES_URL, {'since': since})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count(self):
+        cursor = self._changes(page_size=1)['cursor']
+        self.client.delete(url_for_recipe(self.recipes[2].id))
+
+        # Plus the oldest open transaction on Postgres.
+        with self.assertNumQueries(
+                2 + (connection.vendor == 'postgresql')):
+            self._changes(cursor)
@@ -0,0 +1,188 @@
+import json
+from copy import deepcopy
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.db import connection, connections, router
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase as DjangoTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.routers import reads_from
+from core.models import Recipe
+from recipe.views import PRIMARY_COOKIE, _primary_key
+
+RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+RECIPE_CHANGES_URL = reverse('recipe:recipe-changes')
+
+LRU_CACHE = {'BACKEND': 'recipe.cache.LRUCache'}
+
+PIZZA = {'name': 'Pizza', 'description': 'Sour dough',
+         'ingredients': [{'name': 'tomato'}]}
+
+
+if 'replica' not in connections:
+    # Registered before the test databases are set up, which points the
+    # mirror to the test database.
+    _replica = deepcopy(connections.settings['default'])
+    _replica['TEST']['MIRROR'] = 'default'
+    connections.settings['replica'] = _replica
+
+
+def url_for_recipe(recipe_id: int):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ReplicaRouterTests(DjangoTestCase):
+    def test_reads_go_to_primary_by_default(self):
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_reads_inside_reads_from(self):
+        with reads_from('replica'):
+            self.assertEqual(Recipe.objects.all().db, 'replica')
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertTrue(router.allow_migrate('default', 'core'))
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+
+class PrimaryKeyTests(SimpleTestCase):
+    def _keys(self) -> set:
+        return {
+            _primary_key(RequestFactory().get(
+                RECIPE_URL, HTTP_X_FORWARDED_FOR=f'10.1.0.{i}, 10.2.0.1'))
+            for i in range(3)
+        }
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        self.assertEqual(self._keys(), {'recipes:primary:127.0.0.1'})
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_a_proxy(self):
+        self.assertEqual(self._keys(), {'recipes:primary:10.2.0.1'})
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_LAG=2.5)
+class PrimaryCookieTests(DjangoTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches['default'].clear()
+
+    def _create(self, payload):
+        return self.client.post(RECIPE_URL, json.dumps(payload),
+                                content_type='application/json')
+
+    def test_write_sets_cookie(self):
+        res = self._create(PIZZA)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.cookies[PRIMARY_COOKIE]['max-age'], 3)
+
+    def test_failed_write_sets_no_cookie(self):
+        res = self._create({'name': 'Pizza'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(PRIMARY_COOKIE, res.cookies)
+
+    def test_cookie_keeps_reads_on_primary(self):
+        self._create(PIZZA)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_cookie_without_replicas(self):
+        res = self._create(PIZZA)
+
+        self.assertNotIn(PRIMARY_COOKIE, res.cookies)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'SQLite connections block on uncommitted writes of others')
+@override_settings(DATABASE_REPLICAS=['replica'], RECIPE_CACHE=LRU_CACHE,
+                   RECIPE_CHANGES_DELAY=0)
+class ReplicaReadTests(DjangoTestCase):
+    """A second connection to the test database stands in for the replica.
+
+    It does not see the uncommitted writes of a test, like a replica that
+    has not caught up yet.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.client = APIClient()
+        caches['default'].clear()
+        self.recipe = Recipe.objects.create(
+            name='Paella', description='Rice', ingredient_names=['rice'])
+
+    def test_reads_go_to_replica(self):
+        replica = connections['replica']
+        with CaptureQueriesContext(replica) as queries, \
+                self.assertNumQueries(0):
+            detail = self.client.get(url_for_recipe(self.recipe.id))
+            listed = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(detail.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(listed.data['results'], [])
+
+    def test_export_reads_from_replica(self):
+        res = self.client.get(RECIPE_EXPORT_URL)
+
+        self.assertEqual(b''.join(res.streaming_content), b'')
+
+    def test_client_reads_its_own_writes(self):
+        created = self.client.post(RECIPE_URL, json.dumps(PIZZA),
+                                   content_type='application/json')
+
+        other = APIClient().get(url_for_recipe(created.data['id']),
+                                REMOTE_ADDR='10.0.0.2')
+        res = self.client.get(url_for_recipe(created.data['id']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'Pizza')
+        self.assertEqual(other.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_client_without_cookies_reads_its_own_writes(self):
+        created = self.client.post(RECIPE_URL, json.dumps(PIZZA),
+                                   content_type='application/json')
+        self.client.cookies.clear()
+
+        res = self.client.get(url_for_recipe(created.data['id']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_changes_read_from_primary(self):
+        res = self.client.get(RECIPE_CHANGES_URL)
+
+        self.assertEqual([change['id'] for change in res.data['results']],
+                         [self.recipe.id])
+
+    def test_replica_reads_after_a_write_are_not_cached(self):
+        self.client.get(RECIPE_URL)
+
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(DATABASE_REPLICA_LAG=0)
+    def test_replica_reads_are_cached(self):
+        self.client.get(RECIPE_URL)
+
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(queries), 0)
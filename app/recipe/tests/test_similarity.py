@@ -0,0 +1,277 @@
+import json
+from io import StringIO
+from unittest import TestCase
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeSimilarity,
+    RecipeSimilarityRefresh,
+)
+from recipe.similarity import IngredientMatrix, refresh_queued
+
+RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+
+RECIPES = {
+    1: ['tomato', 'basil', 'dough'],
+    2: ['tomato', 'basil', 'dough', 'cheese'],
+    3: ['tomato', 'rice'],
+    4: ['rice', 'saffron'],
+    5: ['chocolate'],
+}
+
+
+def url_for_recipe(recipe_id: int):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def url_for_similar(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def links(recipes: dict):
+    names = sorted({name for ingredients in recipes.values()
+                    for name in ingredients})
+    return np.array([(recipe_id, names.index(name))
+                     for recipe_id, ingredients in recipes.items()
+                     for name in ingredients])
+
+
+def neighbours(arrays) -> list:
+    recipe_ids, similar_ids, scores = arrays
+    return list(zip(recipe_ids.tolist(), similar_ids.tolist(),
+                    np.round(scores, 3).tolist()))
+
+
+class IngredientMatrixTests(TestCase):
+    def setUp(self):
+        self.matrix = IngredientMatrix(links(RECIPES))
+
+    def test_similarities_ranked_by_jaccard(self):
+        self.assertEqual(neighbours(self.matrix.similarities([0, 2])), [
+            (1, 2, 0.75), (1, 3, 0.25),
+            (3, 4, 0.333), (3, 1, 0.25), (3, 2, 0.2),
+        ])
+
+    def test_neighbours_keeps_the_first(self):
+        self.assertEqual(neighbours(self.matrix.neighbours([2], 2)),
+                         [(3, 4, 0.333), (3, 1, 0.25)])
+
+    def test_no_shared_ingredient(self):
+        self.assertEqual(neighbours(self.matrix.similarities([4])), [])
+
+    def test_duplicate_ingredients_count_once(self):
+        matrix = IngredientMatrix(links({1: ['rice', 'rice'], 2: ['rice']}))
+
+        self.assertEqual(neighbours(matrix.similarities([0])),
+                         [(1, 2, 1.0)])
+
+    def test_chunks_cover_every_row(self):
+        for max_pairs in (1, 5, 100):
+            chunks = list(self.matrix.chunks(max_pairs))
+
+            self.assertEqual(chunks[0][0], 0)
+            self.assertEqual(chunks[-1][1], len(self.matrix))
+            for (_, stop), (start, _) in zip(chunks, chunks[1:]):
+                self.assertEqual(stop, start)
+
+        self.assertEqual(len(list(self.matrix.chunks(100))), 1)
+
+    def test_partial_columns_with_sizes(self):
+        shared = {recipe_id: [name for name in names if name == 'rice']
+                  for recipe_id, names in RECIPES.items()}
+        matrix = IngredientMatrix(
+            links({recipe_id: names for recipe_id, names in shared.items()
+                   if names}),
+            sizes={3: 2, 4: 2})
+
+        self.assertEqual(neighbours(matrix.similarities(matrix.rows([4]))),
+                         [(4, 3, 0.333)])
+
+
+def create_recipes(recipes: dict) -> dict:
+    created = {}
+    for key, names in recipes.items():
+        recipe = Recipe.objects.create(name=f'Recipe {key}',
+                                       description='Cook',
+                                       ingredient_names=names)
+        for name in names:
+            ingredient, _ = Ingredient.objects.get_or_create(name=name)
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=ingredient)
+        created[key] = recipe.id
+    return created
+
+
+def stored(recipe_id: int) -> list:
+    return [
+        (similar_id, round(score, 3))
+        for similar_id, score in RecipeSimilarity.objects
+        .filter(recipe_id=recipe_id)
+        .order_by('-score', 'similar_id')
+        .values_list('similar_id', 'score')
+    ]
+
+
+class ComputeSimilarRecipesCommandTests(DjangoTestCase):
+    def setUp(self):
+        self.ids = create_recipes(RECIPES)
+
+    def _compute(self, *args):
+        call_command('compute_similar_recipes', '--count', '2', *args,
+                     stdout=StringIO())
+
+    def test_stores_top_similar_recipes(self):
+        self._compute('--processes', '1')
+
+        ids = self.ids
+        self.assertEqual(stored(ids[1]), [(ids[2], 0.75), (ids[3], 0.25)])
+        self.assertEqual(stored(ids[3]), [(ids[4], 0.333), (ids[1], 0.25)])
+        self.assertEqual(stored(ids[5]), [])
+
+    def test_worker_processes_give_the_same_result(self):
+        self._compute('--processes', '1', '--chunk-pairs', '1')
+        expected = sorted(RecipeSimilarity.objects.values_list(
+            'recipe_id', 'similar_id', 'score'))
+
+        self._compute('--processes', '2', '--chunk-pairs', '3')
+
+        self.assertEqual(sorted(RecipeSimilarity.objects.values_list(
+            'recipe_id', 'similar_id', 'score')), expected)
+
+    def test_replaces_previous_results(self):
+        self._compute('--processes', '1')
+        RecipeIngredient.objects.filter(recipe_id=self.ids[4]).delete()
+
+        self._compute('--processes', '1')
+
+        self.assertEqual(stored(self.ids[4]), [])
+        self.assertEqual(stored(self.ids[3]),
+                         [(self.ids[1], 0.25), (self.ids[2], 0.2)])
+
+
+@override_settings(RECIPE_SIMILAR_COUNT=2)
+class SimilarRecipesApiTests(DjangoTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.ids = create_recipes(RECIPES)
+        call_command('compute_similar_recipes', '--processes', '1',
+                     '--count', '2', stdout=StringIO())
+
+    def test_similar_recipes(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(url_for_similar(self.ids[1]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': self.ids[2], 'name': 'Recipe 2', 'similarity': 0.75},
+            {'id': self.ids[3], 'name': 'Recipe 3', 'similarity': 0.25},
+        ])
+
+    def test_no_similar_recipes(self):
+        res = self.client.get(url_for_similar(self.ids[5]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_unknown_recipe(self):
+        for recipe_id in (max(self.ids.values()) + 1, 'pizza', '²'):
+            res = self.client.get(url_for_similar(recipe_id))
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def _refresh(self):
+        out = StringIO()
+        call_command('refresh_similar_recipes', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_create_refreshes_similar_recipes(self):
+        res = self.client.post(RECIPE_URL, json.dumps({
+            'name': 'Risotto', 'description': 'Stir',
+            'ingredients': [{'name': 'rice'}, {'name': 'saffron'}],
+        }), content_type='application/json')
+        risotto = res.data['id']
+        self.assertEqual(stored(risotto), [])
+
+        self.assertIn('Refreshed 1 queued recipes.', self._refresh())
+
+        self.assertEqual(stored(risotto),
+                         [(self.ids[4], 1.0), (self.ids[3], 0.333)])
+        self.assertEqual(stored(self.ids[4]),
+                         [(risotto, 1.0), (self.ids[3], 0.333)])
+        self.assertEqual(stored(self.ids[3]),
+                         [(self.ids[4], 0.333), (risotto, 0.333)])
+        self.assertFalse(RecipeSimilarityRefresh.objects.exists())
+
+    def test_bulk_create_refreshes_similar_recipes(self):
+        res = self.client.post(RECIPE_BULK_URL, json.dumps([{
+            'name': 'Hot chocolate', 'description': 'Heat',
+            'ingredients': [{'name': 'chocolate'}, {'name': 'milk'}],
+        }]), content_type='application/json')
+
+        self._refresh()
+
+        self.assertEqual(stored(self.ids[5]), [(res.data[0]['id'], 0.5)])
+
+    def test_update_refreshes_similar_recipes(self):
+        self.client.patch(url_for_recipe(self.ids[2]), json.dumps({
+            'ingredients': [{'name': 'chocolate'}],
+        }), content_type='application/json')
+
+        self._refresh()
+
+        self.assertEqual(stored(self.ids[2]), [(self.ids[5], 1.0)])
+        self.assertEqual(stored(self.ids[5]), [(self.ids[2], 1.0)])
+        # Recipe 2 dropped out of the list of recipe 1.
+        self.assertEqual(stored(self.ids[1]), [(self.ids[3], 0.25)])
+
+    def test_update_without_ingredients_queues_nothing(self):
+        self.client.patch(url_for_recipe(self.ids[2]), json.dumps({
+            'name': 'Pizza',
+        }), content_type='application/json')
+
+        self.assertFalse(RecipeSimilarityRefresh.objects.exists())
+
+    def test_refreshes_queued_recipes_in_batches(self):
+        for key, ingredient in ((3, 'saffron'), (5, 'basil'), (3, 'dough')):
+            self.client.patch(url_for_recipe(self.ids[key]), json.dumps({
+                'ingredients': [{'name': ingredient}],
+            }), content_type='application/json')
+
+        # The three rows of the two recipes are refreshed together.
+        refreshed = refresh_queued(batch_size=3, count=2)
+
+        self.assertEqual(refreshed, 3)
+        self.assertEqual(stored(self.ids[3]), [(self.ids[1], 0.333),
+                                               (self.ids[2], 0.25)])
+        self.assertEqual(stored(self.ids[5]), [(self.ids[1], 0.333),
+                                               (self.ids[2], 0.25)])
+        self.assertEqual(refresh_queued(batch_size=3, count=2), 0)
+
+    def test_common_ingredients_bring_no_candidates(self):
+        res = self.client.post(RECIPE_URL, json.dumps({
+            'name': 'Bruschetta', 'description': 'Toast',
+            'ingredients': [{'name': 'tomato'}, {'name': 'basil'}],
+        }), content_type='application/json')
+        bruschetta = res.data['id']
+
+        # Tomato is in 4 recipes now: recipe 3 only shares it and is left
+        # out, recipes 1 and 2 are still scored on tomato too.
+        refresh_queued(batch_size=10, count=3, max_recipes=3)
+
+        self.assertEqual(stored(bruschetta),
+                         [(self.ids[1], 0.667), (self.ids[2], 0.5)])
+
+    def test_delete_removes_similar_recipes(self):
+        self.client.delete(url_for_recipe(self.ids[2]))
+
+        self.assertEqual(stored(self.ids[1]), [(self.ids[3], 0.25)])
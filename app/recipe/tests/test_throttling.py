@@ -0,0 +1,294 @@
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import throttling
+from recipe.cache import get_cache
+from recipe.throttling import AdaptiveLimiter, LocalBuckets, SharedBuckets
+
+RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+
+COSTS = {'retrieve': 1, 'list': 5, 'search': 10}
+
+
+def url_for_recipe(recipe_id: int):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class BucketTestsMixin:
+    """Tests of a bucket backend. Subclasses set ``clock``, the time
+    function it reads, and implement ``make_buckets(rate, burst)``."""
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch(self.clock, side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.buckets = self.make_buckets(rate=2, burst=10)
+
+    def test_spends_tokens_up_to_burst(self):
+        self.assertEqual(self.buckets.take('a', 6), 0)
+        self.assertEqual(self.buckets.take('a', 4), 0)
+        self.assertEqual(self.buckets.take('a', 1), 0.5)
+
+    def test_refills_at_rate(self):
+        self.buckets.take('a', 10)
+        self.now += 2
+
+        self.assertEqual(self.buckets.take('a', 4), 0)
+        self.assertEqual(self.buckets.take('a', 2), 1)
+
+    def test_clients_have_their_own_bucket(self):
+        self.buckets.take('a', 10)
+
+        self.assertEqual(self.buckets.take('b', 10), 0)
+
+    def test_cost_above_burst_waits_for_a_full_bucket(self):
+        self.assertEqual(self.buckets.take('a', 50), 0)
+        self.assertEqual(self.buckets.take('a', 50), 5)
+
+
+class LocalBucketsTests(BucketTestsMixin, TestCase):
+    clock = 'recipe.throttling.time.monotonic'
+
+    def make_buckets(self, rate: float, burst: float):
+        return LocalBuckets(rate, burst)
+
+    def test_forgets_least_recent_clients(self):
+        buckets = LocalBuckets(rate=1, burst=1, max_entries=2)
+        buckets.take('a', 1)
+        buckets.take('b', 1)
+        buckets.take('c', 1)
+
+        self.assertEqual(buckets.take('a', 1), 0)
+        self.assertEqual(buckets.take('c', 1), 1)
+
+
+class SharedBucketsTests(BucketTestsMixin, DjangoTestCase):
+    clock = 'recipe.throttling.time.time'
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        super().setUp()
+
+    def make_buckets(self, rate: float, burst: float):
+        return SharedBuckets(rate, burst)
+
+    def test_shared_between_instances(self):
+        self.buckets.take('a', 10)
+
+        self.assertEqual(self.make_buckets(rate=2, burst=10).take('a', 1),
+                         0.5)
+
+
+class AdaptiveLimiterTests(TestCase):
+    def test_caps_concurrent_requests(self):
+        limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=10)
+
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        limiter.release(0.01)
+        self.assertTrue(limiter.acquire())
+
+    def _saturate(self, limiter: AdaptiveLimiter, latency: float,
+                  rounds: int = 100, kind: str = ''):
+        for _ in range(rounds):
+            while limiter.acquire():
+                pass
+            limiter.release(latency, kind)
+
+    def test_grows_while_latency_holds(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50)
+
+        self._saturate(limiter, 0.01)
+
+        self.assertEqual(limiter.limit, 50)
+
+    def test_shrinks_when_latency_climbs(self):
+        limiter = AdaptiveLimiter(initial=40, minimum=2, maximum=50)
+        self._saturate(limiter, 0.01, rounds=1)
+
+        self._saturate(limiter, 0.1, rounds=20)
+
+        self.assertLess(limiter.limit, 20)
+
+    def test_idle_requests_leave_the_cap(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50)
+
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(0.01)
+
+        self.assertEqual(limiter.limit, 10)
+
+    def test_light_traffic_never_lowers_the_cap(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50)
+
+        for latency in [0.001, 1.0, 0.002, 5.0] * 20:
+            limiter.acquire()
+            limiter.release(latency)
+
+        self.assertEqual(limiter.limit, 10)
+
+    def test_baseline_forgets_old_requests(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50,
+                                  window=10)
+        # A few fast requests, then the idle latency itself grows.
+        self._saturate(limiter, 0.001, rounds=1)
+
+        self._saturate(limiter, 0.1)
+
+        self.assertEqual(limiter.limit, 50)
+
+    def test_one_slow_request_barely_moves_the_cap(self):
+        limiter = AdaptiveLimiter(initial=40, minimum=2, maximum=50)
+        self._saturate(limiter, 0.01, rounds=1)
+        limit = limiter.limit
+
+        while limiter.acquire():
+            pass
+        limiter.release(1.0)
+
+        self.assertGreater(limiter.limit, limit * 0.9)
+
+    def test_cache_hits_are_compared_apart(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50)
+        view = SimpleNamespace(action='list')
+        request = SimpleNamespace(query_params={})
+        with patch('recipe.throttling.get_limiter', return_value=limiter):
+            for _ in range(100):
+                releases = []
+                while limiter.in_flight < int(limiter.limit):
+                    releases.append(throttling.admit(request, view))
+                releases.pop()(0.0001, cached=True)
+                for release in releases:
+                    release(0.01)
+
+        self.assertEqual(limiter.limit, 50)
+
+    def test_latency_is_compared_per_kind(self):
+        limiter = AdaptiveLimiter(initial=10, minimum=2, maximum=50)
+        self._saturate(limiter, 0.001, rounds=1)
+
+        self._saturate(limiter, 1.0, kind='export')
+
+        self.assertEqual(limiter.limit, 50)
+
+
+@override_settings(
+    RECIPE_THROTTLE={'BACKEND': 'recipe.throttling.LocalBuckets',
+                     'OPTIONS': {'rate': 0.1, 'burst': 20}},
+    RECIPE_THROTTLE_COSTS=COSTS,
+)
+class RecipeThrottleTests(DjangoTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.recipe = Recipe.objects.create(name='Pizza', description='Bake')
+        throttling.get_buckets().clear()
+
+    def _until_throttled(self, *args) -> int:
+        for sent in range(100):
+            res = self.client.get(*args)
+            if res.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                return sent
+        self.fail('Never throttled.')
+
+    def test_searches_cost_more_than_lists_and_details(self):
+        self.assertEqual(self._until_throttled(
+            RECIPE_URL, {'name': 'Piz'}), 2)
+        throttling.get_buckets().clear()
+        self.assertEqual(self._until_throttled(RECIPE_URL), 4)
+        throttling.get_buckets().clear()
+        self.assertEqual(
+            self._until_throttled(url_for_recipe(self.recipe.id)), 20)
+
+    def test_retry_after(self):
+        self._until_throttled(RECIPE_URL)
+
+        res = self.client.get(url_for_recipe(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(res['Retry-After']), 1)
+
+    def test_clients_are_throttled_separately(self):
+        self._until_throttled(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL, REMOTE_ADDR='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def _until_throttled_forwarded(self) -> int:
+        for sent in range(100):
+            res = self.client.get(
+                RECIPE_URL, HTTP_X_FORWARDED_FOR=f'10.1.0.{sent}')
+            if res.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                return sent
+        return sent + 1
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        self.assertEqual(self._until_throttled_forwarded(), 4)
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_a_proxy(self):
+        self.assertEqual(self._until_throttled_forwarded(), 100)
+
+    @override_settings(RECIPE_THROTTLE=None)
+    def test_off_without_setting(self):
+        for _ in range(30):
+            res = self.client.get(RECIPE_URL, {'name': 'Piz'})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(RECIPE_CONCURRENCY={'initial': 2, 'minimum': 2,
+                                       'maximum': 2})
+class RecipeLoadSheddingTests(DjangoTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Cached pages would be served without calling the view.
+        get_cache().clear()
+
+    def test_sheds_beyond_the_cap(self):
+        limiter = throttling.get_limiter()
+        for _ in range(2):
+            limiter.acquire()
+            self.addCleanup(limiter.release, 0.01)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_slot_is_given_back(self):
+        for _ in range(5):
+            res = self.client.get(RECIPE_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(throttling.get_limiter().in_flight, 0)
+
+    def test_export_holds_its_slot_until_sent(self):
+        Recipe.objects.create(name='Pizza', description='Bake')
+
+        res = self.client.get(RECIPE_EXPORT_URL)
+
+        self.assertEqual(throttling.get_limiter().in_flight, 1)
+        self.assertIn(b'Pizza', b''.join(res.streaming_content))
+        self.assertEqual(throttling.get_limiter().in_flight, 0)
+
+    def test_slot_is_given_back_on_errors(self):
+        with patch('recipe.views.RecipeViewSet._list',
+                   side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.get(RECIPE_URL)
+
+        self.assertEqual(throttling.get_limiter().in_flight, 0)
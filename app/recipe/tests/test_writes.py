@@ -0,0 +1,174 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeWrite
+from recipe.serializers import RecipeSerializer
+from recipe.writes import process_writes
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+PIZZA = {'name': 'Pizza', 'description': 'Bake',
+         'ingredients': [{'name': 'dough'}, {'name': 'tomato'}]}
+
+
+def url_for_recipe(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def url_for_write(write_id: int):
+    return reverse('recipe:recipe-write', args=[write_id])
+
+
+class AsyncWriteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _send(self, method: str, url: str, payload: dict):
+        return getattr(self.client, method)(
+            url, json.dumps(payload), content_type='application/json',
+            HTTP_PREFER='respond-async')
+
+    def _process(self, *args) -> str:
+        out = StringIO()
+        call_command('process_recipe_writes', '--once', *args, stdout=out)
+        return out.getvalue()
+
+    def test_create_is_queued(self):
+        res = self._send('post', RECIPE_URL, PIZZA)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], RecipeWrite.PENDING)
+        self.assertEqual(res['Location'], res.data['url'])
+        self.assertEqual(res['Preference-Applied'], 'respond-async')
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_without_prefer_writes_synchronously(self):
+        res = self.client.post(RECIPE_URL, json.dumps(PIZZA),
+                               content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(RecipeWrite.objects.exists())
+
+    def test_creates_are_applied_in_one_batch(self):
+        ids = [self._send('post', RECIPE_URL, {**PIZZA, 'name': name})
+               .data['id'] for name in ('Pizza', 'Calzone', 'Focaccia')]
+
+        out = self._process()
+
+        self.assertIn('Applied 3 writes.', out)
+        for write_id, name in zip(ids, ('Pizza', 'Calzone', 'Focaccia')):
+            res = self.client.get(url_for_write(write_id))
+            self.assertEqual(res.data['status'], RecipeWrite.DONE)
+            self.assertIsNotNone(res.data['finished_at'])
+            recipe = Recipe.objects.get(pk=res.data['recipe_id'])
+            self.assertEqual(recipe.name, name)
+            self.assertEqual(recipe.ingredient_names, ['dough', 'tomato'])
+
+    def _batch_queries(self, size: int) -> int:
+        for i in range(size):
+            self._send('post', RECIPE_URL, {**PIZZA, 'name': f'Pizza {i}'})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_writes(100), size)
+        return len(queries)
+
+    def test_batch_statement_count_does_not_grow(self):
+        self.assertEqual(self._batch_queries(3), self._batch_queries(6))
+
+    def test_validation_errors_are_reported(self):
+        write_id = self._send('post', RECIPE_URL, {'name': 'Pizza'}) \
+            .data['id']
+        self._send('post', RECIPE_URL, PIZZA)
+
+        self._process()
+
+        res = self.client.get(url_for_write(write_id))
+        self.assertEqual(res.data['status'], RecipeWrite.FAILED)
+        self.assertIn('description', res.data['errors'])
+        self.assertIsNone(res.data['recipe_id'])
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_database_errors_only_fail_their_create(self):
+        ids = [self._send('post', RECIPE_URL, {**PIZZA, 'name': name})
+               .data['id'] for name in ('Pizza', 'Broken', 'Calzone')]
+        create = RecipeSerializer.create
+
+        def reject(*args, **kwargs):
+            # Aborts the transaction, like any statement Postgres rejects.
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1 / 0')
+
+        def create_or_reject(serializer, validated_data):
+            if validated_data['name'] == 'Broken':
+                reject()
+            return create(serializer, validated_data)
+
+        with patch.object(Recipe.objects, 'bulk_create', reject), \
+                patch.object(RecipeSerializer, 'create', create_or_reject):
+            self.assertIn('Applied 3 writes.', self._process())
+
+        writes = RecipeWrite.objects.in_bulk(ids)
+        self.assertEqual(
+            [writes[write_id].status for write_id in ids],
+            [RecipeWrite.DONE, RecipeWrite.FAILED, RecipeWrite.DONE])
+        self.assertIn('division by zero', writes[ids[1]].errors['detail'])
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', flat=True)),
+            ['Calzone', 'Pizza'])
+        self.assertEqual(Recipe.objects.get(pk=writes[ids[0]].recipe_id)
+                         .ingredient_names, ['dough', 'tomato'])
+
+    def test_updates_are_applied_in_order(self):
+        recipe = Recipe.objects.create(name='Pizza', description='Bake')
+        self._send('put', url_for_recipe(recipe.id),
+                   {**PIZZA, 'name': 'Calzone'})
+        self._send('patch', url_for_recipe(recipe.id),
+                   {'ingredients': [{'name': 'cheese'}]})
+
+        self._process()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Calzone')
+        self.assertEqual(recipe.ingredient_names, ['cheese'])
+
+    def test_update_of_missing_recipe_fails(self):
+        res = self._send('patch', url_for_recipe(404), {'name': 'Calzone'})
+
+        self._process()
+
+        res = self.client.get(url_for_write(res.data['id']))
+        self.assertEqual(res.data['status'], RecipeWrite.FAILED)
+        self.assertEqual(res.data['errors'], {'detail': 'Not found.'})
+
+    def test_batch_size(self):
+        for _ in range(3):
+            self._send('post', RECIPE_URL, PIZZA)
+
+        self.assertEqual(process_writes(2), 2)
+        self.assertEqual(process_writes(2), 1)
+        self.assertEqual(process_writes(2), 0)
+
+    def test_update_of_invalid_id(self):
+        res = self._send('patch', url_for_recipe('²'), {'name': 'Calzone'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(RecipeWrite.objects.exists())
+
+    def test_invalid_payload(self):
+        res = self._send('post', RECIPE_URL, [PIZZA])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RecipeWrite.objects.exists())
+
+    def test_unknown_write(self):
+        res = self.client.get(url_for_write(404))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,282 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+# Query parameters that turn a list into a search.
+SEARCH_PARAMS = ('name', 'iname', 'ingredients', 'exclude_ingredients')
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float,
+            burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class LocalBuckets:
+    """Token buckets of the clients seen by this process.
+
+    Each client gets ``rate`` tokens per second, up to ``burst``. With
+    several worker processes a client gets that much from each of them,
+    use :class:`SharedBuckets` for a global limit. The least recently
+    seen clients are forgotten beyond ``max_entries``, their bucket is
+    full when they come back.
+    """
+
+    def __init__(self, rate: float, burst: float, max_entries: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str, cost: float) -> float:
+        """Spend ``cost`` tokens of ``client``.
+
+        Returns 0 if they were spent, else the seconds until the bucket
+        holds enough of them.
+        """
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = _refill(tokens, updated, now, self.rate, self.burst)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedBuckets:
+    """Token buckets kept in one of the Django ``CACHES``, shared by all
+    workers.
+
+    Buckets are read and written back without a lock, so concurrent
+    requests of one client on different processes may spend the same
+    tokens: the limit can be exceeded by the number of processes.
+    """
+
+    def __init__(self, rate: float, burst: float, alias: str = 'default'):
+        self.rate = rate
+        self.burst = burst
+        self.alias = alias
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def take(self, client: str, cost: float) -> float:
+        cost = min(cost, self.burst)
+        key = f'recipes:throttle:{client}'
+        now = time.time()
+        tokens, updated = self._cache.get(key) or (self.burst, now)
+        tokens = _refill(tokens, updated, now, self.rate, self.burst)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate
+        # Past this timeout the bucket is full again anyway.
+        self._cache.set(key, (tokens, now),
+                        math.ceil(self.burst / self.rate) + 1)
+        return wait
+
+    def clear(self):
+        self._cache.clear()
+
+
+class AdaptiveLimiter:
+    """Caps the requests a process serves at once, with a cap that follows
+    their latency.
+
+    For each kind of request, the lowest latency of its last ``window``
+    requests is taken as its latency on an idle database. While their
+    smoothed latency stays within ``tolerance`` times of it the cap grows,
+    and it shrinks in proportion as they get slower, so that extra
+    requests are shed early instead of queueing up behind the database and
+    slowing down everyone. The cap only moves when the requests in flight
+    come near it: below that, slow requests are slow on their own.
+    """
+
+    def __init__(self, initial: int = 20, minimum: int = 4,
+                 maximum: int = 200, tolerance: float = 2.0,
+                 smoothing: float = 0.2, window: int = 1000):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.in_flight = 0
+        self._recent = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a slot, False if all of them are taken."""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, kind: str = ''):
+        """Give back a slot held for ``latency`` seconds by a request of
+        some ``kind``."""
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            recent = self._recent.get(kind)
+            if recent is None:
+                recent = self._recent[kind] = deque(maxlen=self.window)
+            recent.append(latency)
+            smoothed = self._latencies.get(kind, latency)
+            smoothed += (latency - smoothed) * self.smoothing
+            self._latencies[kind] = smoothed
+            if in_flight < self.limit / 2:
+                # Far from the cap, latency says nothing about it.
+                return
+
+            gradient = min(1.0, max(
+                0.5, self.tolerance * min(recent) / max(smoothed, 1e-9)))
+            target = self.limit * gradient + math.sqrt(self.limit)
+            limit = (1 - self.smoothing) * self.limit + \
+                self.smoothing * target
+            self.limit = min(self.maximum, max(self.minimum, limit))
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many requests in progress, retry later.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait: int):
+        super().__init__()
+        # Sent as Retry-After by the DRF exception handler.
+        self.wait = wait
+
+
+_buckets = None
+_limiter = None
+
+
+def get_buckets():
+    """Token buckets of RECIPE_THROTTLE, None when it is off."""
+    global _buckets
+    config = settings.RECIPE_THROTTLE
+    if not config:
+        return None
+    if _buckets is None:
+        _buckets = import_string(config['BACKEND'])(
+            **config.get('OPTIONS', {}))
+    return _buckets
+
+
+def get_limiter():
+    """Concurrency limiter of RECIPE_CONCURRENCY, None when it is off."""
+    global _limiter
+    config = settings.RECIPE_CONCURRENCY
+    if not config:
+        return None
+    if _limiter is None:
+        _limiter = AdaptiveLimiter(**config)
+    return _limiter
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _buckets, _limiter
+    if setting == 'RECIPE_THROTTLE':
+        _buckets = None
+    elif setting == 'RECIPE_CONCURRENCY':
+        _limiter = None
+
+
+def request_kind(request, view) -> str:
+    """Action of a request, 'search' for filtered lists."""
+    if view.action == 'list' and any(
+            request.query_params.get(param) for param in SEARCH_PARAMS):
+        return 'search'
+    return view.action
+
+
+def request_cost(request, view) -> float:
+    """Tokens spent by a request, from RECIPE_THROTTLE_COSTS."""
+    return settings.RECIPE_THROTTLE_COSTS.get(request_kind(request, view), 1)
+
+
+class RecipeCostThrottle(BaseThrottle):
+    """Throttle clients by the cost of their requests.
+
+    Full lists, searches and exports spend more tokens of the client's
+    bucket than detail reads, so a client hammering them runs out first.
+    """
+
+    def allow_request(self, request, view) -> bool:
+        buckets = get_buckets()
+        if buckets is None:
+            return True
+        self.wait_seconds = buckets.take(self.get_ident(request),
+                                         request_cost(request, view))
+        return not self.wait_seconds
+
+    def wait(self):
+        return math.ceil(self.wait_seconds)
+
+
+def admit(request, view):
+    """Take a slot of the concurrency limiter for a request.
+
+    Raises Overloaded when they are all taken. Returns a function to call
+    with the duration of the request when it ends, and whether it was
+    served from the response cache, None when the limiter is off.
+    """
+    limiter = get_limiter()
+    if limiter is None:
+        return None
+    if not limiter.acquire():
+        raise Overloaded(wait=1)
+    kind = request_kind(request, view)
+
+    def release(latency: float, cached: bool = False):
+        # Cache hits skip the database: their latency is tracked apart.
+        limiter.release(latency, f'{kind}:cached' if cached else kind)
+    return release
+
+
+class ClosingIterator:
+    """Iterates over ``iterable`` and calls ``on_close`` once when closed.
+
+    Set as the ``streaming_content`` of a response, it is closed with the
+    response once the content is sent.
+    """
+
+    def __init__(self, iterable, on_close):
+        self._iterable = iterable
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
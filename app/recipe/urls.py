@@ -1,13 +1,30 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from recipe import views
+from recipe.async_views import async_view
 
 router = DefaultRouter()
 router.register('recipes', views.RecipeViewSet)
 
 app_name = 'recipe'
 
+# Routes served by async views when RECIPE_ASYNC_VIEWS is on.
+ASYNC_ROUTES = ('recipe-list', 'recipe-detail')
+
+
+def _urls():
+    if not settings.RECIPE_ASYNC_VIEWS:
+        return router.urls
+    return [
+        re_path(str(url.pattern), async_view(url.callback),
+                url.default_args, url.name)
+        if url.name in ASYNC_ROUTES else url
+        for url in router.urls
+    ]
+
+
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(_urls()))
 ]
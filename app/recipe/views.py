@@ -1,17 +1,387 @@
-from rest_framework import viewsets
+import math
+import random
+import time
 
-from core.models import Recipe
-from recipe.serializers import RecipeSerializer
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.functions import Lower
+from django.http import Http404, QueryDict, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.urls import replace_query_param
+
+from core.db.routers import reads_from
+from core.models import (
+    Recipe,
+    RecipeIngredient,
+    RecipeSimilarity,
+    RecipeWrite,
+)
+from recipe import autocomplete
+from recipe.cache import cached_response
+from recipe.changes import decode_cursor, encode_cursor, recipe_changes
+from recipe.export import export_recipes
+from recipe.pagination import RecipeCursorPagination
+from recipe.serializers import (
+    RECIPE_FIELDS,
+    RecipeSerializer,
+    recipe_columns,
+    serialize_recipes,
+)
+from recipe.throttling import ClosingIterator, RecipeCostThrottle, admit
+from recipe.writes import respond_async
+
+# Set on responses to writes. While a client sends it back, its reads go
+# to the primary, so it sees its own writes before the replicas do.
+PRIMARY_COOKIE = 'recipe_primary'
+
+
+def _primary_key(request) -> str:
+    """Cache key marking that the client of ``request`` just wrote.
+
+    Covers clients that do not keep cookies. They are told apart like the
+    throttles do, by their address.
+    """
+    return f'recipes:primary:{BaseThrottle().get_ident(request)}'
+
+
+def _is_id(value: str) -> bool:
+    # str.isdigit() also accepts digits such as '²' that int() rejects.
+    return value.isascii() and value.isdigit()
+
+
+def _ingredient_names(value: str) -> list:
+    return sorted({name.strip().lower() for name in value.split(',')
+                   if name.strip()})
+
+
+def _recipes_with_ingredients(names: list):
+    """Ids of the recipes having an ingredient for each of ``names``.
+
+    Names are looked up in the small ingredient catalogue through its
+    LOWER(name) index, then the (ingredient, recipe) index on
+    core_recipeingredient maps them to recipes and a single GROUP BY
+    intersects them.
+    """
+    return (
+        RecipeIngredient.objects
+        .annotate(normalized_name=Lower('ingredient__name'))
+        .filter(normalized_name__in=names)
+        .values('recipe_id')
+        .annotate(matches=Count('normalized_name', distinct=True))
+        .filter(matches=len(names))
+        .values('recipe_id')
+    )
+
+
+def _has_any_ingredient(names: list) -> Exists:
+    """Whether the outer recipe has an ingredient in ``names``.
+
+    A correlated anti-join lets the planner stop at the first matching
+    link of each recipe instead of collecting the ids of every recipe
+    using one of ``names`` as NOT IN does.
+    """
+    return Exists(
+        RecipeIngredient.objects
+        .annotate(normalized_name=Lower('ingredient__name'))
+        .filter(recipe=OuterRef('pk'), normalized_name__in=names)
+    )
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
+    pagination_class = RecipeCursorPagination
+    throttle_classes = [RecipeCostThrottle]
+    # Actions whose safe requests may read from a replica.
+    replica_actions = ('list', 'retrieve', 'export', 'similar')
+
+    def dispatch(self, request, *args, **kwargs):
+        self.read_db = self._get_read_db(request)
+        self._release = None
+        response = None
+        with reads_from(self.read_db):
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            finally:
+                if self._release is not None:
+                    self._release_when_sent(response)
+        if (settings.DATABASE_REPLICAS
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            lag = math.ceil(settings.DATABASE_REPLICA_LAG)
+            response.set_cookie(PRIMARY_COOKIE, '1', httponly=True,
+                                samesite='Lax', max_age=lag)
+            caches['default'].set(_primary_key(request), True, lag)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # After the throttles, so throttled clients do not take a slot.
+        self._release = admit(request, self)
+        self._admitted_at = time.perf_counter()
+
+    def _release_when_sent(self, response):
+        """Give back the concurrency slot of the request, once a streamed
+        response has been sent."""
+        release, admitted_at = self._release, self._admitted_at
+
+        def end():
+            release(time.perf_counter() - admitted_at,
+                    getattr(response, 'from_cache', False))
+        if response is not None and response.streaming:
+            response.streaming_content = ClosingIterator(
+                response.streaming_content, end)
+        else:
+            end()
+
+    def _get_read_db(self, request):
+        """Replica to read from for ``request``, None for the primary."""
+        action = self.action_map.get(request.method.lower())
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS
+                or action not in self.replica_actions
+                or PRIMARY_COOKIE in request.COOKIES
+                or caches['default'].get(_primary_key(request))):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def _settle(self) -> float:
+        return settings.DATABASE_REPLICA_LAG if self.read_db else 0
 
     def get_queryset(self):
         queryset = self.queryset
         name = self.request.query_params.get('name')
         if name:
             queryset = queryset.filter(name__contains=name)
+        iname = self.request.query_params.get('iname')
+        if iname:
+            queryset = queryset.filter(name__icontains=iname)
+        ids = self._get_ids()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        ingredients = _ingredient_names(
+            self.request.query_params.get('ingredients', ''))
+        if ingredients:
+            queryset = queryset.filter(
+                id__in=_recipes_with_ingredients(ingredients))
+        excluded = _ingredient_names(
+            self.request.query_params.get('exclude_ingredients', ''))
+        if excluded:
+            queryset = queryset.filter(~_has_any_ingredient(excluded))
 
         return queryset.order_by('-id')
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, self._list, settle=self._settle())
+
+    def _list(self):
+        fields = self._get_fields()
+        columns = recipe_columns(fields)
+        if 'id' not in columns:
+            # The cursor is built from the id, read it even if not shown.
+            columns = ('id',) + columns
+        rows = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serialize_recipes(rows, fields))
+
+        return self.get_paginated_response(serialize_recipes(page, fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        if not _is_id(pk):
+            return super().retrieve(request, *args, **kwargs)
+        return cached_response(request, lambda: self._retrieve(int(pk)),
+                               recipe_id=int(pk), settle=self._settle())
+
+    def _retrieve(self, pk: int):
+        fields = self._get_fields()
+        rows = self.get_queryset().values(*recipe_columns(fields))
+        row = get_object_or_404(rows, pk=pk)
+
+        return Response(serialize_recipes([row], fields)[0])
+
+    def create(self, request, *args, **kwargs):
+        if respond_async(request):
+            return self._enqueue(request, RecipeWrite.CREATE)
+        return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        if respond_async(request):
+            pk = kwargs[self.lookup_field]
+            if not _is_id(pk):
+                raise Http404
+            return self._enqueue(request, RecipeWrite.UPDATE,
+                                 recipe_id=int(pk),
+                                 partial=kwargs.get('partial', False))
+        return super().update(request, *args, **kwargs)
+
+    def _enqueue(self, request, action: str, **fields):
+        """Queue a write for `process_recipe_writes` and answer 202."""
+        payload = request.data
+        if isinstance(payload, QueryDict):
+            payload = payload.dict()
+        if not isinstance(payload, dict):
+            raise ValidationError({'non_field_errors': [
+                'Expected an object.'
+            ]})
+        write = RecipeWrite.objects.create(
+            action=action, payload=payload, **fields)
+
+        url = request.build_absolute_uri(
+            reverse('recipe:recipe-write', args=[write.id]))
+        return Response(
+            {'id': write.id, 'status': write.status, 'url': url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url,
+                     'Preference-Applied': 'respond-async'},
+        )
+
+    def _get_fields(self) -> tuple:
+        """Fields requested with ``?fields=``, in serializer order."""
+        fields = self.request.query_params.get('fields')
+        if fields is None:
+            return RECIPE_FIELDS
+        expected = f'a comma separated list of {", ".join(RECIPE_FIELDS)}'
+        requested = {field.strip() for field in fields.split(',')} - {''}
+        if not requested:
+            raise ValidationError({'fields': [f'Expected {expected}.']})
+        unknown = requested.difference(RECIPE_FIELDS)
+        if unknown:
+            raise ValidationError({'fields': [
+                f'Unknown fields: {", ".join(sorted(unknown))}. '
+                f'Expected {expected}.'
+            ]})
+
+        return tuple(field for field in RECIPE_FIELDS if field in requested)
+
+    def _get_ids(self):
+        ids = self.request.query_params.get('ids')
+        if ids is None:
+            return None
+        try:
+            ids = [int(pk) for pk in ids.split(',') if pk]
+        except ValueError:
+            raise ValidationError(
+                {'ids': ['Expected a comma separated list of ids.']})
+        if len(ids) > settings.RECIPE_BULK_MAX_ITEMS:
+            raise ValidationError({'ids': [
+                f'Ensure there are no more than '
+                f'{settings.RECIPE_BULK_MAX_ITEMS} ids.'
+            ]})
+
+        return ids
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.RECIPE_BULK_MAX_ITEMS,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request):
+        ids = self._get_ids()
+        if not ids:
+            raise ValidationError(
+                {'ids': ['This query parameter is required.']})
+        Recipe.objects.filter(id__in=ids).delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False)
+    def export(self, request):
+        queryset = self.get_queryset()
+        # Streamed after dispatch returns, bind it to the database now.
+        queryset = queryset.using(queryset.db)
+        return StreamingHttpResponse(
+            export_recipes(queryset,
+                           settings.RECIPE_EXPORT_CHUNK_SIZE,
+                           self._get_fields()),
+            content_type='application/x-ndjson',
+        )
+
+    @action(detail=False, url_path=r'writes/(?P<write_id>[0-9]+)',
+            url_name='write')
+    def write(self, request, write_id):
+        write = get_object_or_404(RecipeWrite, pk=write_id)
+
+        return Response({
+            'id': write.id,
+            'action': write.action,
+            'status': write.status,
+            'recipe_id': write.recipe_id,
+            'errors': write.errors,
+            'created_at': write.created_at,
+            'finished_at': write.finished_at,
+        })
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        if not _is_id(pk):
+            raise Http404
+        similar = list(
+            RecipeSimilarity.objects
+            .filter(recipe_id=pk)
+            .order_by('-score', 'similar_id')
+            .values_list('similar_id', 'similar__name', 'score'))
+        if not similar and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+
+        return Response({'results': [
+            {'id': recipe_id, 'name': name, 'similarity': score}
+            for recipe_id, name, score in similar
+        ]})
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        prefix = request.query_params.get('q', '').lstrip()
+        limit = request.query_params.get('limit', '10')
+        if not _is_id(limit) or \
+                not 1 <= int(limit) <= autocomplete.MAX_RESULTS:
+            raise ValidationError({'limit': [
+                f'Expected a number from 1 to {autocomplete.MAX_RESULTS}.'
+            ]})
+        if not prefix:
+            return Response({'results': []})
+
+        return Response({
+            'results': autocomplete.get_index().search(prefix, int(limit)),
+        })
+
+    @action(detail=False)
+    def changes(self, request):
+        since = request.query_params.get('since')
+        try:
+            position = decode_cursor(since) if since else None
+        except ValueError:
+            raise ValidationError({'since': ['Invalid cursor.']})
+
+        changes, position, has_more = recipe_changes(
+            position,
+            self.paginator.get_page_size(request),
+            settings.RECIPE_CHANGES_DELAY,
+        )
+        cursor = encode_cursor(*position) if position else None
+        url = request.build_absolute_uri()
+        return Response({
+            'cursor': cursor,
+            'next': replace_query_param(url, 'since', cursor)
+            if cursor else url,
+            'has_more': has_more,
+            'results': changes,
+        })
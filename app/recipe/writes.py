@@ -0,0 +1,126 @@
+import time
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from core.models import Recipe, RecipeWrite
+from recipe.serializers import RecipeSerializer
+
+
+def respond_async(request) -> bool:
+    """Whether the client asked for the write to be queued (RFC 7240)."""
+    preferences = request.headers.get('Prefer', '').split(',')
+    return 'respond-async' in (pref.strip().lower() for pref in preferences)
+
+
+def _finish(write: RecipeWrite, errors=None):
+    write.status = RecipeWrite.FAILED if errors else RecipeWrite.DONE
+    write.errors = errors
+    write.finished_at = timezone.now()
+
+
+def _create(writes: list):
+    """Validate queued creates one by one and insert the valid ones with
+    a single batch create.
+
+    If the batch create fails, the creates are retried one by one so that
+    only those the database rejects fail.
+    """
+    valid = []
+    for write in writes:
+        serializer = RecipeSerializer(data=write.payload)
+        if serializer.is_valid():
+            valid.append((write, serializer.validated_data))
+        else:
+            _finish(write, serializer.errors)
+    if not valid:
+        return
+
+    try:
+        with transaction.atomic():
+            recipes = RecipeSerializer(many=True).create(
+                [data for _, data in valid])
+    except DatabaseError:
+        for write, data in valid:
+            _create_one(write, data)
+        return
+    for (write, _), recipe in zip(valid, recipes):
+        write.recipe_id = recipe.id
+        _finish(write)
+
+
+def _create_one(write: RecipeWrite, data: dict):
+    try:
+        with transaction.atomic():
+            recipe = RecipeSerializer().create(data)
+    except DatabaseError as e:
+        _finish(write, {'detail': str(e)})
+        return
+    write.recipe_id = recipe.id
+    _finish(write)
+
+
+def _update(write: RecipeWrite):
+    recipe = Recipe.objects.filter(pk=write.recipe_id).first()
+    if recipe is None:
+        _finish(write, {'detail': 'Not found.'})
+        return
+    serializer = RecipeSerializer(recipe, data=write.payload,
+                                  partial=write.partial)
+    if not serializer.is_valid():
+        _finish(write, serializer.errors)
+        return
+    serializer.save()
+    _finish(write)
+
+
+def process_writes(batch_size: int) -> int:
+    """Apply up to ``batch_size`` of the oldest pending writes in one
+    transaction and return how many were applied.
+
+    The writes are locked with SKIP LOCKED, so concurrent workers take
+    distinct batches. If the worker dies the transaction rolls back and
+    the writes stay pending.
+    """
+    with transaction.atomic():
+        writes = list(
+            RecipeWrite.objects
+            .filter(status=RecipeWrite.PENDING)
+            .order_by('id')
+            .select_for_update(skip_locked=True)[:batch_size])
+        if not writes:
+            return 0
+
+        _create([write for write in writes
+                 if write.action == RecipeWrite.CREATE])
+        # In queue order, so later updates of a recipe win.
+        for write in writes:
+            if write.action != RecipeWrite.UPDATE:
+                continue
+            try:
+                with transaction.atomic():
+                    _update(write)
+            except DatabaseError as e:
+                _finish(write, {'detail': str(e)})
+
+        RecipeWrite.objects.bulk_update(
+            writes, ['status', 'recipe_id', 'errors', 'finished_at'])
+    return len(writes)
+
+
+def drain(batch_size: int, poll_interval: float, once: bool = False) -> int:
+    """Apply pending writes batch after batch, waiting ``poll_interval``
+    seconds whenever the queue is empty.
+
+    With ``once``, return the number of writes applied as soon as the
+    queue is empty.
+    """
+    applied = 0
+    while True:
+        processed = process_writes(batch_size)
+        applied += processed
+        if processed:
+            continue
+        if once:
+            return applied
+        time.sleep(poll_interval)